@@ -1,70 +1,335 @@
-import os
+import contextvars
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from dotenv import load_dotenv
-from openai import OpenAI
+from app import fewshot
+from app.cache import LRUCache
+from app.config import settings
+from app.db import current_db_path, run_query
+from app.llm import ResilientClient
+from app.prompt import (
+    FALLBACK_MARKER,
+    get_correction_prompt,
+    get_error_message,
+    get_fallback_query,
+    get_success_message,
+    get_system_prompt,
+)
+from app.sqlparams import parameterize, unparameterized
+from app.sqlrepair import is_read_only, repair, strip_fences
+from app.tenants import current_tenant
 
-from app.db import run_query
-from app.prompt import get_error_message, get_success_message, get_system_prompt
+# OpenAI klienten oprettes først når AI'en bruges første gang. Importen af
+# `openai` (og dens HTTP stack) koster mærkbart ved opstart, og processer der
+# kun viser CRM siderne eller kører tests har ikke brug for den.
+_llm = None
+_llm_key = None
+_llm_lock = threading.Lock()
 
-# Load environment variables
-load_dotenv()
+_translation_cache = None
 
-# Initialize OpenAI client - handle missing API key gracefully
-api_key = os.environ.get("OPENAI_API_KEY")
-if not api_key or api_key == "your-openai-api-key-here":
-    client = None
-else:
-    client = OpenAI(api_key=api_key)
+
+class AIUnavailableError(RuntimeError):
+    """AI tjenesten svarer ikke, og der findes intet cached/regelbaseret svar."""
+
+
+def get_llm():
+    """
+    Returnerer den delte ResilientClient, eller None uden API key.
+
+    Klienten bygges dovent og genopbygges hvis API nøglen skifter.
+    """
+    global _llm, _llm_key
+    api_key = settings.openai_api_key
+    if api_key is None:
+        return None
+    if _llm is not None and _llm_key == api_key:
+        return _llm
+    with _llm_lock:
+        if _llm is None or _llm_key != api_key:
+            from openai import OpenAI
+
+            # Retries styres af ResilientClient, ikke af OpenAI klienten selv
+            client = OpenAI(
+                api_key=api_key, timeout=settings.llm_timeout, max_retries=0
+            )
+            _llm, _llm_key = ResilientClient(client), api_key
+        return _llm
+
+
+def get_translation_cache() -> LRUCache:
+    """Spørgsmål -> SQL der er kørt uden fejl; bruges før AI kaldet og som fallback"""
+    global _translation_cache
+    tenant = current_tenant()
+    if tenant is not None:
+        return tenant.resource(
+            "translations", lambda: LRUCache(settings.nl_sql_cache_size)
+        )
+    if _translation_cache is None:
+        with _llm_lock:
+            if _translation_cache is None:
+                _translation_cache = LRUCache(settings.nl_sql_cache_size)
+    return _translation_cache
+
+
+def _cache_key(question: str) -> str:
+    return " ".join(question.lower().split()).rstrip("?. ")
+
+
+def _messages(question: str):
+    # Kun de kendte par der ligner spørgsmålet mest sendes med som eksempler
+    examples = fewshot.select_examples(question, key=current_db_path())
+    return [
+        {"role": "system", "content": get_system_prompt(examples)},
+        {"role": "user", "content": question},
+    ]
 
 
 def nl_to_sql(question: str) -> str:
-    if not client:
+    llm = get_llm()
+    if llm is None:
         return "SELECT * FROM customers; -- AI ikke tilgængelig"
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": get_system_prompt()},
-            {"role": "user", "content": question},
-        ],
-        temperature=0,
-    )
-    sql = response.choices[0].message.content.strip()
+    cached = get_translation_cache().get(_cache_key(question))
+    if cached:
+        return cached
+
+    try:
+        response = llm.chat(
+            model="gpt-4o-mini",
+            messages=_messages(question),
+            temperature=0,
+        )
+    except Exception as e:
+        # AI er nede eller for langsom - brug regelbaseret svar hvis muligt
+        fallback = get_fallback_query(question)
+        if fallback is None:
+            raise AIUnavailableError(get_error_message("ai_unavailable")) from e
+        print(f"⚠️ AI kald fejlede ({e}) - bruger standardforespørgsel")
+        return fallback
+
+    return strip_fences(response.choices[0].message.content)
+
+
+def correct_sql(question: str, sql: str, error: str) -> str:
+    """
+    Beder AI'en rette en forespørgsel der ikke kunne repareres lokalt.
+
+    Returns:
+        str: Den rettede SQL, eller den oprindelige hvis kaldet fejler
+    """
+    llm = get_llm()
+    if llm is None:
+        return sql
+    messages = _messages(question) + [
+        {"role": "assistant", "content": sql},
+        {"role": "user", "content": get_correction_prompt(error)},
+    ]
+    try:
+        response = llm.chat(model="gpt-4o-mini", messages=messages, temperature=0)
+    except Exception as e:
+        print(f"⚠️ AI rettelse fejlede: {e}")
+        return sql
+    return strip_fences(response.choices[0].message.content)
+
+
+def _preflight(question: str, sql: str):
+    """
+    Validerer SQL'en med EXPLAIN og reparerer den før den køres.
 
-    # Clean up SQL - remove markdown formatting if present
-    if sql.startswith("```sql"):
-        sql = sql.replace("```sql", "").replace("```", "").strip()
-    elif sql.startswith("```"):
-        sql = sql.replace("```", "").strip()
+    Lokale rettelser forsøges først; kun hvis SQL'en stadig ikke kompilerer,
+    bruges ét AI kald med fejlteksten.
 
-    return sql
+    Returns:
+        tuple[str, list[str]]: Endelig SQL og beskrivelser af rettelserne
+    """
+    checked = repair(sql)
+    fixes = list(checked.fixes)
+    if checked.error:
+        corrected = repair(correct_sql(question, checked.sql, checked.error))
+        fixes.append(f"AI rettelse efter fejl: {checked.error}")
+        fixes.extend(corrected.fixes)
+        if corrected.error is None:
+            return corrected.sql, fixes
+    return checked.sql, fixes
 
 
 def ask(question: str):
-    if not client:
+    if get_llm() is None:
         return {"error": get_error_message("no_api_key")}
 
-    sql = nl_to_sql(question)
+    started = time.perf_counter()
+    try:
+        sql = nl_to_sql(question)
+    except AIUnavailableError as e:
+        return {"error": str(e), "timings": {"translate_ms": _elapsed_ms(started)}}
+    timings = {"translate_ms": _elapsed_ms(started)}
+
+    fixes = []
+    if FALLBACK_MARKER not in sql:
+        validating = time.perf_counter()
+        sql, fixes = _preflight(question, sql)
+        timings["repair_ms"] = _elapsed_ms(validating)
+    if not is_read_only(sql):
+        # Forbindelsen går tilbage i puljen - den må ikke ændres af AI'ens SQL
+        return {
+            "sql": sql,
+            "error": get_error_message("read_only"),
+            "repairs": fixes,
+            "timings": timings,
+        }
+    prepared = time.perf_counter()
     print(f"{get_success_message('query_generated')} {sql}")
 
+    # Literaler løftes ud som parametre, så varianter genbruger samme statement
+    if settings.sql_parameterize:
+        query = parameterize(sql)
+    else:
+        query = unparameterized(sql)
+
     try:
-        result = run_query(sql)
+        result = _run_parameterized(sql, query)
+        timings["query_ms"] = _elapsed_ms(prepared)
+        _remember(question, sql, result)
 
         # Hvis ingen data fundet, lav AI forklaring
         if not result:
             explanation = generate_explanation(question, sql)
-            return {"sql": sql, "rows": result, "ai_explanation": explanation}
+            return {
+                "sql": sql,
+                "rows": result,
+                "ai_explanation": explanation,
+                "fingerprint": query.fingerprint,
+                "repairs": fixes,
+                "timings": timings,
+            }
+
+        return {
+            "sql": sql,
+            "rows": result,
+            "fingerprint": query.fingerprint,
+            "repairs": fixes,
+            "timings": timings,
+        }
+    except Exception as e:
+        timings["query_ms"] = _elapsed_ms(prepared)
+        return {
+            "sql": sql,
+            "error": str(e),
+            "fingerprint": query.fingerprint,
+            "repairs": fixes,
+            "timings": timings,
+        }
+
+
+def _remember(question: str, sql: str, result):
+    """Gemmer en oversættelse der er kørt uden fejl i cachen og indekset."""
+    if FALLBACK_MARKER in sql:
+        return
+    get_translation_cache().put(_cache_key(question), sql)
+    if result:
+        # Kun læsninger der gav data bruges som fremtidige eksempler
+        fewshot.learn(current_db_path(), question, sql)
 
-        return {"sql": sql, "rows": result}
+
+def _template_rejected(error) -> bool:
+    """True hvis fejlen skyldes skabelonen (parse/binding), ikke selve data."""
+    if isinstance(error, (sqlite3.ProgrammingError, sqlite3.InterfaceError)):
+        return True
+    message = str(error)
+    return isinstance(error, sqlite3.OperationalError) and any(
+        text in message
+        for text in ("syntax error", "unrecognized token", "incomplete input")
+    )
+
+
+def _run_parameterized(sql: str, query):
+    """
+    Kør skabelonen med parametre.
+
+    Kun hvis SQLite afviser selve skabelonen (fx en literal der ikke måtte
+    blive til en parameter), køres den rå SQL; andre fejl ville blot ske igen.
+    """
+    if not query.params:
+        return run_query(sql)
+    try:
+        return run_query(query.template, query.params)
+    except sqlite3.Error as e:
+        if not _template_rejected(e):
+            raise
+        return run_query(sql)
+
+
+def _elapsed_ms(start: float, end: float = None) -> float:
+    end = time.perf_counter() if end is None else end
+    return round((end - start) * 1000, 2)
+
+
+def ask_many(questions, max_concurrency: int = None):
+    """
+    Besvarer mange spørgsmål på én gang.
+
+    Spørgsmål der kun adskiller sig i store/små bogstaver, mellemrum eller
+    afsluttende tegnsætning oversættes og køres kun én gang, og de unikke
+    spørgsmål behandles samtidigt (AI kaldet er I/O-bundet). SQL køres på
+    forbindelser fra `app.db` puljen.
+
+    Args:
+        questions (list[str]): Spørgsmål i naturligt sprog
+        max_concurrency (int, optional): Maks samtidige spørgsmål.
+            Standard er settings.ask_batch_concurrency.
+
+    Returns:
+        dict: `results` (ét resultat pr. spørgsmål i samme rækkefølge),
+            `unique_questions` og `total_ms`
+    """
+    started = time.perf_counter()
+    # Samme nøgle som oversættelsescachen; første formulering bliver spurgt
+    keys = [_cache_key(q or "") for q in questions]
+    unique = {}
+    for key, question in zip(keys, questions):
+        if key and key not in unique:
+            unique[key] = question.strip()
+    limit = max_concurrency or settings.ask_batch_concurrency
+    workers = max(1, min(limit, len(unique)))
+
+    answers = {}
+    if unique:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Hver opgave kører i en kopi af konteksten (tenantens database)
+            futures = {
+                key: executor.submit(contextvars.copy_context().run, _safe_ask, q)
+                for key, q in unique.items()
+            }
+            answers = {key: f.result() for key, f in futures.items()}
+
+    results = []
+    for original, key in zip(questions, keys):
+        answer = answers.get(key) or {"error": "Tomt spørgsmål"}
+        results.append({"question": original, **answer})
+
+    return {
+        "results": results,
+        "unique_questions": len(unique),
+        "total_ms": _elapsed_ms(started),
+    }
+
+
+def _safe_ask(question: str):
+    try:
+        return ask(question)
     except Exception as e:
-        return {"sql": sql, "error": str(e)}
+        return {"error": str(e)}
 
 
 def generate_explanation(question: str, sql: str) -> str:
     """
     Genererer en kort AI forklaring når der ikke findes data
     """
-    if not client:
+    llm = get_llm()
+    if llm is None:
         return "Ingen data fundet for denne forespørgsel."
 
     explanation_prompt = f"""
@@ -81,7 +346,7 @@ Vær positiv og hjælpsom.
 """
 
     try:
-        response = client.chat.completions.create(
+        response = llm.chat(
             model="gpt-4o-mini",
             messages=[{"role": "user", "content": explanation_prompt}],
             temperature=0.7,
@@ -0,0 +1,482 @@
+"""
+Support Solutions CRM - Analysetabeller (rollups)
+================================================
+
+Forudberegnede, tidsopdelte summer til trend- og pipelinespørgsmål, så AI'en
+ikke skal skrive tunge GROUP BY forespørgsler over de rå tabeller. Tabellerne
+holdes opdateret inkrementelt af triggers: hver INSERT/UPDATE/DELETE lægger
+kun forskellen til eller trækker den fra den berørte række.
+
+Triggerne er korrekte for alle forbindelser, også `sqlite3` shells og andre
+processer uden `recursive_triggers`. Her fyrer DELETE triggers ikke for en
+række som INSERT OR REPLACE erstatter. Derfor gemmer en BEFORE INSERT trigger
+den eksisterende række i `<rollup>_replaced`, og INSERT triggeren trækker den
+fra. Fyrer DELETE triggeren alligevel, rydder den den gemte række. Ved
+UPSERT og INSERT OR IGNORE bliver den gemte række liggende ubrugt og ryddes
+ved næste INSERT med samme id.
+
+- deal_monthly: deals pr. forventet lukkemåned og stage
+- deal_pipeline_snapshots: pipeline pr. stage som den så ud ved hver måned
+- deal_stage_transitions: stage-skift pr. måned (til konverteringsrater)
+- consultant_hours: allokerede og arbejdede timer pr. konsulent og
+  projekternes startmåned
+- project_burn_monthly: budget, forbrug og timer pr. startmåned og status
+
+Genopbyg fra bunden: python -m app.analytics --rebuild
+"""
+
+import sys
+from collections import namedtuple
+
+from app.dimensions import execute_statements
+
+# Én rollup: tabel, kildetabel, grupperingsnøgler og summer. Udtrykkene
+# bruger `{r}` for rækken (NEW/OLD i triggers, kildetabellen ved backfill),
+# og `columns` er de kildekolonner der påvirker rollup'en ved UPDATE.
+Rollup = namedtuple("Rollup", "table source keys measures columns")
+
+ROLLUPS = [
+    Rollup(
+        "deal_monthly",
+        "deals",
+        {
+            "month": "COALESCE(strftime('%Y-%m', {r}.expected_close_date), 'ukendt')",
+            "stage": "COALESCE({r}.stage, 'ukendt')",
+        },
+        {
+            "deals": "1",
+            "value": "COALESCE({r}.value, 0)",
+            "weighted_value": (
+                "COALESCE({r}.value, 0) * COALESCE({r}.probability, 0) / 100.0"
+            ),
+        },
+        ("expected_close_date", "stage", "value", "probability"),
+    ),
+    Rollup(
+        "project_burn_monthly",
+        "projects",
+        {
+            "month": "COALESCE(strftime('%Y-%m', {r}.start_date), 'ukendt')",
+            "status": "COALESCE({r}.status, 'ukendt')",
+        },
+        {
+            "projects": "1",
+            "budget": "COALESCE({r}.budget, 0)",
+            "actual_cost": "COALESCE({r}.actual_cost, 0)",
+            "hours_estimated": "COALESCE({r}.hours_estimated, 0)",
+            "hours_actual": "COALESCE({r}.hours_actual, 0)",
+        },
+        (
+            "start_date",
+            "status",
+            "budget",
+            "actual_cost",
+            "hours_estimated",
+            "hours_actual",
+        ),
+    ),
+]
+
+_CURRENT_MONTH = "strftime('%Y-%m', 'now')"
+
+EXTRA_TABLES_SQL = f"""
+CREATE TABLE IF NOT EXISTS deal_pipeline_snapshots (
+    month TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    deals INTEGER NOT NULL DEFAULT 0,
+    value REAL NOT NULL DEFAULT 0,
+    weighted_value REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (month, stage)
+);
+
+CREATE TABLE IF NOT EXISTS deal_stage_transitions (
+    month TEXT NOT NULL,
+    from_stage TEXT NOT NULL,
+    to_stage TEXT NOT NULL,
+    deals INTEGER NOT NULL DEFAULT 0,
+    value REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (month, from_stage, to_stage)
+);
+
+CREATE TRIGGER IF NOT EXISTS deals_stage_transition
+AFTER UPDATE OF stage ON deals
+WHEN OLD.stage IS NOT NEW.stage
+BEGIN
+    INSERT INTO deal_stage_transitions (month, from_stage, to_stage, deals, value)
+    VALUES (
+        {_CURRENT_MONTH},
+        COALESCE(OLD.stage, 'ukendt'),
+        COALESCE(NEW.stage, 'ukendt'),
+        1,
+        COALESCE(NEW.value, 0)
+    )
+    ON CONFLICT (month, from_stage, to_stage) DO UPDATE SET
+        deals = deals + 1,
+        value = value + excluded.value;
+END;
+"""
+
+
+# Månedens snapshot for en stage følger deal_monthly løbende (samme delta
+# som rollup-rækken); tidligere måneder står tilbage som de så ud ved
+# månedens sidste ændring. Første ændring i en ny måned starter snapshottet
+# fra stagens totaler.
+_SNAPSHOT_DELTAS = {
+    "INSERT": ("NEW", "+ NEW.{name}"),
+    "UPDATE": ("NEW", "+ NEW.{name} - OLD.{name}"),
+    "DELETE": ("OLD", "- OLD.{name}"),
+}
+
+
+def _snapshot_trigger_sql(event: str) -> str:
+    # INSERT OR REPLACE/UPSERT virker ikke her: en trigger arver
+    # konfliktpolitikken fra det ydre statement (rollup'ens UPSERT)
+    row, delta = _SNAPSHOT_DELTAS[event]
+    measures = ("deals", "value", "weighted_value")
+    updates = ", ".join(
+        f"{name} = {name} {delta.format(name=name)}" for name in measures
+    )
+    current = f"month = {_CURRENT_MONTH} AND stage = {row}.stage"
+    # Totalerne beregnes kun når månedens række mangler
+    totals = ", ".join(
+        f"(SELECT COALESCE(SUM({name}), 0) FROM deal_monthly WHERE stage = {row}.stage)"
+        for name in measures
+    )
+    return f"""
+CREATE TRIGGER IF NOT EXISTS deal_monthly_snapshot_{event.lower()}
+AFTER {event} ON deal_monthly
+BEGIN
+    UPDATE deal_pipeline_snapshots SET {updates} WHERE {current};
+    INSERT INTO deal_pipeline_snapshots (month, stage, deals, value, weighted_value)
+    SELECT {_CURRENT_MONTH}, {row}.stage, {totals}
+    WHERE NOT EXISTS (SELECT 1 FROM deal_pipeline_snapshots WHERE {current});
+END;
+"""
+
+
+def _table_sql(rollup: Rollup) -> str:
+    keys = ",\n    ".join(f"{key} NOT NULL" for key in rollup.keys)
+    measures = ",\n    ".join(
+        f"{name} {'INTEGER' if expr == '1' else 'REAL'} NOT NULL DEFAULT 0"
+        for name, expr in rollup.measures.items()
+    )
+    replaced = ",\n    ".join(rollup.columns)
+    return f"""
+CREATE TABLE IF NOT EXISTS {rollup.table} (
+    {keys},
+    {measures},
+    PRIMARY KEY ({", ".join(rollup.keys)})
+);
+
+CREATE TABLE IF NOT EXISTS {rollup.table}_replaced (
+    id INTEGER PRIMARY KEY,
+    {replaced}
+);
+"""
+
+
+def _add_sql(rollup: Rollup, row: str) -> str:
+    names = [*rollup.keys, *rollup.measures]
+    values = [expr.format(r=row) for expr in rollup.keys.values()]
+    values += [expr.format(r=row) for expr in rollup.measures.values()]
+    updates = ", ".join(
+        f"{name} = {name} + excluded.{name}" for name in rollup.measures
+    )
+    return f"""
+    INSERT INTO {rollup.table} ({", ".join(names)})
+    VALUES ({", ".join(values)})
+    ON CONFLICT ({", ".join(rollup.keys)}) DO UPDATE SET {updates};"""
+
+
+def _subtract_sql(rollup: Rollup, row: str) -> str:
+    updates = ", ".join(
+        f"{name} = {name} - ({expr.format(r=row)})"
+        for name, expr in rollup.measures.items()
+    )
+    where = " AND ".join(
+        f"{key} = {expr.format(r=row)}" for key, expr in rollup.keys.items()
+    )
+    count = next(iter(rollup.measures))
+    return f"""
+    UPDATE {rollup.table} SET {updates} WHERE {where};
+    DELETE FROM {rollup.table} WHERE {where} AND {count} <= 0;"""
+
+
+def _subtract_replaced_sql(rollup: Rollup) -> str:
+    # Som _subtract_sql, men for rækken INSERT OR REPLACE har erstattet
+    stash = f"FROM {rollup.table}_replaced r WHERE r.id = NEW.id"
+    updates = ", ".join(
+        f"{name} = {name} - (SELECT {expr.format(r='r')} {stash})"
+        for name, expr in rollup.measures.items()
+    )
+    keys = ", ".join(expr.format(r="r") for expr in rollup.keys.values())
+    where = f"({', '.join(rollup.keys)}) IN (SELECT {keys} {stash})"
+    count = next(iter(rollup.measures))
+    return f"""
+    UPDATE {rollup.table} SET {updates} WHERE {where};
+    DELETE FROM {rollup.table} WHERE {where} AND {count} <= 0;
+    DELETE FROM {rollup.table}_replaced WHERE id = NEW.id;"""
+
+
+def _replace_trigger_sql(name, table, source, columns) -> str:
+    # Gemmer rækken en INSERT OR REPLACE vil erstatte (se modulets docstring)
+    columns = ", ".join(["id", *columns])
+    return f"""
+CREATE TRIGGER IF NOT EXISTS {name}_replace
+BEFORE INSERT ON {source}
+BEGIN
+    DELETE FROM {table}_replaced WHERE id = NEW.id;
+    INSERT INTO {table}_replaced ({columns})
+    SELECT {columns} FROM {source} WHERE id = NEW.id;
+END;
+"""
+
+
+def _triggers_sql(rollup: Rollup) -> str:
+    name = f"{rollup.source}_{rollup.table}"
+    replace = _replace_trigger_sql(name, rollup.table, rollup.source, rollup.columns)
+    return f"""{replace}
+CREATE TRIGGER IF NOT EXISTS {name}_insert
+AFTER INSERT ON {rollup.source}
+BEGIN{_subtract_replaced_sql(rollup)}{_add_sql(rollup, "NEW")}
+END;
+
+CREATE TRIGGER IF NOT EXISTS {name}_update
+AFTER UPDATE OF {", ".join(rollup.columns)} ON {rollup.source}
+BEGIN{_subtract_sql(rollup, "OLD")}{_add_sql(rollup, "NEW")}
+END;
+
+CREATE TRIGGER IF NOT EXISTS {name}_delete
+AFTER DELETE ON {rollup.source}
+BEGIN{_subtract_sql(rollup, "OLD")}
+    DELETE FROM {rollup.table}_replaced WHERE id = OLD.id;
+END;
+"""
+
+
+# consultant_hours afhænger af både project_consultants og projekternes
+# startmåned, så den genberegnes pr. berørt konsulent i stedet for med
+# deltaer. Det er idempotent og derfor korrekt uanset hvordan rækken skrives.
+_HOURS_SELECT = """
+    SELECT pc.consultant_id,
+           COALESCE(strftime('%Y-%m', p.start_date), 'ukendt'),
+           COUNT(*),
+           SUM(COALESCE(pc.hours_allocated, 0)),
+           SUM(COALESCE(pc.hours_worked, 0))
+    FROM project_consultants pc LEFT JOIN projects p ON p.id = pc.project_id
+    WHERE {where}
+    GROUP BY 1, 2"""
+
+
+def _recompute_hours_sql(consultants: str) -> str:
+    where = f"consultant_id IN ({consultants})"
+    return f"""
+    DELETE FROM consultant_hours WHERE {where};
+    INSERT INTO consultant_hours
+        (consultant_id, month, assignments, hours_allocated, hours_worked)
+    {_HOURS_SELECT.format(where="pc." + where).strip()};"""
+
+
+_PROJECT_CONSULTANTS = "SELECT consultant_id FROM project_consultants WHERE project_id"
+_REPLACED_CONSULTANT = "SELECT consultant_id FROM consultant_hours_replaced WHERE id"
+
+CONSULTANT_HOURS_SQL = f"""
+CREATE TABLE IF NOT EXISTS consultant_hours (
+    consultant_id INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    assignments INTEGER NOT NULL DEFAULT 0,
+    hours_allocated REAL NOT NULL DEFAULT 0,
+    hours_worked REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (consultant_id, month)
+);
+
+CREATE TABLE IF NOT EXISTS consultant_hours_replaced (
+    id INTEGER PRIMARY KEY,
+    consultant_id
+);
+
+CREATE INDEX IF NOT EXISTS idx_project_consultants_consultant
+ON project_consultants (consultant_id);
+
+CREATE INDEX IF NOT EXISTS idx_project_consultants_project
+ON project_consultants (project_id);
+{_replace_trigger_sql(
+    "project_consultants_consultant_hours",
+    "consultant_hours",
+    "project_consultants",
+    ("consultant_id",),
+)}
+CREATE TRIGGER IF NOT EXISTS project_consultants_consultant_hours_insert
+AFTER INSERT ON project_consultants
+BEGIN{_recompute_hours_sql(
+    f"SELECT NEW.consultant_id UNION {_REPLACED_CONSULTANT} = NEW.id"
+)}
+    DELETE FROM consultant_hours_replaced WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS project_consultants_consultant_hours_update
+AFTER UPDATE OF consultant_id, project_id, hours_allocated, hours_worked
+ON project_consultants
+BEGIN{_recompute_hours_sql("OLD.consultant_id, NEW.consultant_id")}
+END;
+
+CREATE TRIGGER IF NOT EXISTS project_consultants_consultant_hours_delete
+AFTER DELETE ON project_consultants
+BEGIN{_recompute_hours_sql("OLD.consultant_id")}
+END;
+
+CREATE TRIGGER IF NOT EXISTS projects_consultant_hours_insert
+AFTER INSERT ON projects
+BEGIN{_recompute_hours_sql(f"{_PROJECT_CONSULTANTS} = NEW.id")}
+END;
+
+CREATE TRIGGER IF NOT EXISTS projects_consultant_hours_update
+AFTER UPDATE OF id, start_date ON projects
+BEGIN{_recompute_hours_sql(f"{_PROJECT_CONSULTANTS} IN (OLD.id, NEW.id)")}
+END;
+
+CREATE TRIGGER IF NOT EXISTS projects_consultant_hours_delete
+AFTER DELETE ON projects
+BEGIN{_recompute_hours_sql(f"{_PROJECT_CONSULTANTS} = OLD.id")}
+END;
+"""
+
+
+def _backfill(conn, rollup: Rollup):
+    keys = [expr.format(r="s") for expr in rollup.keys.values()]
+    sums = [f"SUM({expr.format(r='s')})" for expr in rollup.measures.values()]
+    conn.execute(f"DELETE FROM {rollup.table}")
+    conn.execute(f"DELETE FROM {rollup.table}_replaced")
+    conn.execute(
+        f"INSERT INTO {rollup.table} ({', '.join([*rollup.keys, *rollup.measures])}) "
+        f"SELECT {', '.join(keys + sums)} FROM {rollup.source} s "
+        f"GROUP BY {', '.join(str(i + 1) for i in range(len(keys)))}"
+    )
+
+
+def _backfill_consultant_hours(conn):
+    conn.execute("DELETE FROM consultant_hours")
+    conn.execute("DELETE FROM consultant_hours_replaced")
+    conn.execute(
+        "INSERT INTO consultant_hours "
+        "(consultant_id, month, assignments, hours_allocated, hours_worked)"
+        + _HOURS_SELECT.format(where="pc.consultant_id IS NOT NULL")
+    )
+
+
+ANALYTICS_SQL = (
+    "".join(_table_sql(rollup) for rollup in ROLLUPS)
+    + EXTRA_TABLES_SQL
+    + "".join(_triggers_sql(rollup) for rollup in ROLLUPS)
+    + CONSULTANT_HOURS_SQL
+    + "".join(_snapshot_trigger_sql(event) for event in _SNAPSHOT_DELTAS)
+)
+
+_TRIGGERS = (
+    {
+        f"{rollup.source}_{rollup.table}_{event}"
+        for rollup in ROLLUPS
+        for event in ("replace", "insert", "update", "delete")
+    }
+    | {
+        f"{source}_consultant_hours_{event}"
+        for source in ("project_consultants", "projects")
+        for event in ("insert", "update", "delete")
+    }
+    | {
+        "project_consultants_consultant_hours_replace",
+        "deals_stage_transition",
+        "deal_monthly_snapshot_insert",
+        "deal_monthly_snapshot_update",
+        "deal_monthly_snapshot_delete",
+    }
+)
+
+
+def _is_installed(conn) -> bool:
+    triggers = {
+        row[0]
+        for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+    }
+    return _TRIGGERS <= triggers
+
+
+def snapshot_pipeline(conn, month=None):
+    """
+    Gemmer pipelinen pr. stage som snapshot for en måned (standard: denne).
+
+    Triggers holder den aktuelle måned opdateret ved hver ændring; jobbet
+    sikrer at måneder uden ændringer i deals også får et snapshot.
+    """
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO deal_pipeline_snapshots "
+            "(month, stage, deals, value, weighted_value) "
+            f"SELECT COALESCE(?, {_CURRENT_MONTH}), stage, SUM(deals), SUM(value), "
+            "SUM(weighted_value) FROM deal_monthly GROUP BY stage",
+            (month,),
+        )
+
+
+def rebuild_analytics(conn):
+    """Genberegner alle rollups fra de rå tabeller (fx efter bulk-import)."""
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for rollup in ROLLUPS:
+            _backfill(conn, rollup)
+        _backfill_consultant_hours(conn)
+    snapshot_pipeline(conn)
+
+
+def _drop_outdated(conn):
+    # Ældre versioner havde andre triggers og consultant_hours uden måned;
+    # de oprettes forfra, da CREATE ... IF NOT EXISTS ikke ændrer dem
+    for name in _TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(consultant_hours)")}
+    if columns and "month" not in columns:
+        conn.execute("DROP TABLE consultant_hours")
+
+
+def ensure_analytics(conn):
+    """
+    Opretter analysetabeller og triggers hvis de mangler og udfylder dem.
+
+    Idempotent ligesom `ensure_dimensions`; skriver kun første gang den køres
+    mod en database. Stage-skift kan ikke genskabes bagudrettet, så
+    deal_stage_transitions starter tom.
+
+    Args:
+        conn (sqlite3.Connection): Åben forbindelse til CRM databasen
+    """
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+    if not {rollup.source for rollup in ROLLUPS} <= tables or _is_installed(conn):
+        return
+
+    with conn:
+        # Lås databasen og tjek igen, så to processer ikke migrerer samtidig
+        conn.execute("BEGIN IMMEDIATE")
+        if _is_installed(conn):
+            return
+        _drop_outdated(conn)
+        execute_statements(conn, ANALYTICS_SQL)
+        for rollup in ROLLUPS:
+            _backfill(conn, rollup)
+        _backfill_consultant_hours(conn)
+    snapshot_pipeline(conn)
+
+
+def main():
+    from app.db import get_pool
+
+    with get_pool().connection() as conn:
+        if "--rebuild" in sys.argv:
+            rebuild_analytics(conn)
+            print("📊 Analysetabeller genberegnet")
+        else:
+            snapshot_pipeline(conn)
+            print("📊 Pipeline snapshot gemt")
+
+
+if __name__ == "__main__":
+    main()
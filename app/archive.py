@@ -0,0 +1,182 @@
+"""
+Support Solutions CRM - Arkivering af gamle aktiviteter
+=======================================================
+
+`activities` vokser hele tiden, men siderne og dashboardet viser næsten kun
+de nyeste. Aktiviteter ældre end en horisont (ARCHIVE_HORIZON_DAYS) flyttes
+derfor til en separat arkivfil, som ATTACHes på alle forbindelser fra
+`app.db`. Hverdagsforespørgsler rammer kun den varme `activities` tabel,
+mens TEMP viewet `activities_all` samler begge dele til spørgsmål om hele
+historikken.
+
+Kør arkiveringen: python -m app.archive
+"""
+
+import threading
+from pathlib import Path
+
+from app.config import settings
+
+ARCHIVE_SCHEMA = "archive"
+
+# Arkivfiler hvor tabellen allerede er oprettet/tjekket i denne proces
+_prepared = set()
+_prepared_lock = threading.Lock()
+
+
+def archive_path(db_path) -> Path:
+    """
+    Arkivfilen for en database: CRM_ARCHIVE_PATH eller `<navn>_archive.db`.
+
+    CRM_ARCHIVE_PATH gælder kun standarddatabasen; tenants (app.tenants) har
+    altid deres eget arkiv ved siden af databasen.
+    """
+    db_path = Path(db_path)
+    if settings.archive_path and db_path == Path(settings.db_path):
+        return Path(settings.archive_path)
+    return db_path.with_name(f"{db_path.stem}_archive{db_path.suffix or '.db'}")
+
+
+def _activity_columns(conn, schema="main"):
+    return [
+        (row[1], row[2])
+        for row in conn.execute(f"PRAGMA {schema}.table_info(activities)")
+    ]
+
+
+def _prepare_archive(conn, key):
+    """Opretter arkivtabel og indekser og tilføjer nye kolonner fra main."""
+    with _prepared_lock:
+        if key in _prepared:
+            return
+        columns = _activity_columns(conn)
+        archived = {name for name, _ in _activity_columns(conn, ARCHIVE_SCHEMA)}
+        with conn:
+            if not archived:
+                definitions = ", ".join(
+                    f"{name} {kind} PRIMARY KEY" if name == "id" else f"{name} {kind}"
+                    for name, kind in columns
+                )
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.activities "
+                    f"({definitions})"
+                )
+            else:
+                for name, kind in columns:
+                    if name not in archived:
+                        conn.execute(
+                            f"ALTER TABLE {ARCHIVE_SCHEMA}.activities "
+                            f"ADD COLUMN {name} {kind}"
+                        )
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_activities_date "
+                "ON activities(activity_date)"
+            )
+        _prepared.add(key)
+
+
+def ensure_hot_index(conn):
+    """Indeks på den varme tabels dato (dashboard og /activities sorterer på den)."""
+    if (
+        _activity_columns(conn)
+        and not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'idx_activities_date'"
+        ).fetchone()
+    ):
+        with conn:
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_activities_date "
+                "ON activities(activity_date)"
+            )
+
+
+def attach_archive(conn, db_path):
+    """
+    ATTACHer arkivet og opretter `activities_all` på en ny forbindelse.
+
+    Skal kaldes uden for en transaktion, lige efter forbindelsen er åbnet.
+    Databaser uden `activities` tabel springes over.
+    """
+    if not _activity_columns(conn):
+        return
+    path = archive_path(db_path)
+    conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (str(path),))
+    _prepare_archive(conn, str(path))
+
+    columns = ", ".join(name for name, _ in _activity_columns(conn))
+    conn.execute(
+        "CREATE TEMP VIEW IF NOT EXISTS activities_all AS "
+        f"SELECT {columns} FROM main.activities UNION ALL "
+        f"SELECT {columns} FROM {ARCHIVE_SCHEMA}.activities"
+    )
+
+
+def archive_activities(conn, horizon_days=None, batch_size=None) -> int:
+    """
+    Flytter aktiviteter ældre end horisonten til arkivet i små batches.
+
+    Hver batch kopieres med INSERT OR IGNORE og slettes derefter fra den
+    varme tabel i samme transaktion. I SQLites standard journal mode er
+    commit på tværs af de to filer atomisk; ellers gør INSERT OR IGNORE på
+    id at en afbrudt kørsel blot fortsætter hvor den slap. Jobbet kan derfor
+    køres igen når som helst.
+
+    Args:
+        conn (sqlite3.Connection): Forbindelse med arkivet attached
+        horizon_days (int, optional): Standard er settings.archive_horizon_days
+        batch_size (int, optional): Standard er settings.archive_batch_size
+
+    Returns:
+        int: Antal flyttede aktiviteter
+    """
+    horizon_days = (
+        settings.archive_horizon_days if horizon_days is None else horizon_days
+    )
+    batch_size = batch_size or settings.archive_batch_size
+    cutoff = conn.execute(
+        "SELECT datetime('now', ?)", (f"-{int(horizon_days)} days",)
+    ).fetchone()[0]
+
+    columns = ", ".join(name for name, _ in _activity_columns(conn))
+    moved = 0
+    while True:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            ids = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT id FROM main.activities WHERE activity_date < ? "
+                    "ORDER BY activity_date LIMIT ?",
+                    (cutoff, batch_size),
+                )
+            ]
+            if not ids:
+                return moved
+            placeholders = ", ".join("?" * len(ids))
+            conn.execute(
+                f"INSERT OR IGNORE INTO {ARCHIVE_SCHEMA}.activities ({columns}) "
+                f"SELECT {columns} FROM main.activities WHERE id IN ({placeholders})",
+                ids,
+            )
+            conn.execute(
+                f"DELETE FROM main.activities AS a WHERE id IN ({placeholders}) "
+                f"AND EXISTS (SELECT 1 FROM {ARCHIVE_SCHEMA}.activities "
+                "WHERE id = a.id)",
+                ids,
+            )
+        moved += len(ids)
+
+
+def main():
+    from app.db import get_pool
+
+    with get_pool().connection() as conn:
+        moved = archive_activities(conn)
+    print(
+        f"📦 Arkiverede {moved} aktiviteter ældre end "
+        f"{settings.archive_horizon_days} dage"
+    )
+
+
+if __name__ == "__main__":
+    main()
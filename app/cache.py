@@ -0,0 +1,42 @@
+"""
+Support Solutions CRM - Simpel trådsikker LRU cache
+==================================================
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Trådsikker LRU cache med fast maksimal størrelse.
+
+    Args:
+        maxsize (int): Maks antal elementer før de ældst brugte fjernes
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
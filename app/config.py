@@ -1,8 +1,149 @@
+"""
+Support Solutions CRM - Konfiguration
+====================================
+
+Ét samlet `settings` objekt. Værdierne læses dovent fra miljøet (inkl. en
+eventuel .env fil) første gang de bruges, så import af modulet ikke koster
+noget. De gamle konstanter (`DB_PATH`, `DB_POOL_SIZE`, ...) kan stadig
+importeres og slås op i `settings`.
+"""
+
 import os
+import threading
 from pathlib import Path
 
-# Database path
-DB_PATH = Path(__file__).resolve().parent.parent / "data" / "example.db"
+DEFAULT_DB_PATH = Path(__file__).resolve().parent.parent / "data" / "example.db"
+
+# Pladsholderen fra .env.example tæller ikke som en rigtig nøgle
+API_KEY_PLACEHOLDER = "your-openai-api-key-here"
+
+
+def _flag(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Navn -> (miljøvariabel, type, standardværdi)
+_FIELDS = {
+    # Database
+    "db_path": ("CRM_DB_PATH", Path, str(DEFAULT_DB_PATH)),
+    # Antal ledige SQLite forbindelser der genbruges pr. database
+    "db_pool_size": ("DB_POOL_SIZE", int, "8"),
+    # Antal forberedte statements hver forbindelse cacher (sqlite3 standard: 128)
+    "sqlite_statement_cache": ("SQLITE_STATEMENT_CACHE", int, "256"),
+    # Batch-spørgsmål: samtidige AI oversættelser og maks antal spørgsmål
+    "ask_batch_concurrency": ("ASK_BATCH_CONCURRENCY", int, "4"),
+    "ask_batch_max_questions": ("ASK_BATCH_MAX_QUESTIONS", int, "50"),
+    # AI kald: timeout pr. forsøg, samlet deadline og retries (sekunder)
+    "llm_timeout": ("LLM_TIMEOUT", float, "15"),
+    "llm_deadline": ("LLM_DEADLINE", float, "30"),
+    "llm_max_retries": ("LLM_MAX_RETRIES", int, "2"),
+    "llm_backoff_base": ("LLM_BACKOFF_BASE", float, "0.5"),
+    "llm_backoff_max": ("LLM_BACKOFF_MAX", float, "4"),
+    # Hedged requests: send duplikat efter så mange sekunder (0 = slået fra)
+    # og antal tråde til dem i processen
+    "llm_hedge_delay": ("LLM_HEDGE_DELAY", float, "0"),
+    "llm_hedge_workers": ("LLM_HEDGE_WORKERS", int, "16"),
+    # Circuit breaker: fejl i træk før den åbner, og sekunder før næste prøvekald
+    "llm_breaker_threshold": ("LLM_BREAKER_THRESHOLD", int, "5"),
+    "llm_breaker_reset": ("LLM_BREAKER_RESET", float, "30"),
+    # Løft literaler i AI'ens SQL ud som bundne parametre (app.sqlparams)
+    "sql_parameterize": ("SQL_PARAMETERIZE", _flag, "1"),
+    # Antal vellykkede spørgsmål -> SQL oversættelser der huskes
+    "nl_sql_cache_size": ("NL_SQL_CACHE_SIZE", int, "512"),
+    # Few-shot: antal par i eksempelindekset, eksempler pr. prompt og
+    # laveste lighed (0-1) et eksempel skal have for at komme med
+    "fewshot_index_size": ("FEWSHOT_INDEX_SIZE", int, "512"),
+    "fewshot_examples": ("FEWSHOT_EXAMPLES", int, "4"),
+    "fewshot_min_score": ("FEWSHOT_MIN_SCORE", float, "0.1"),
+    # Arkiv: fil til gamle aktiviteter (tom = `<db>_archive.db` ved siden af
+    # databasen), alder i dage før de arkiveres, og rækker pr. transaktion
+    "archive_path": ("CRM_ARCHIVE_PATH", str, ""),
+    "archive_horizon_days": ("ARCHIVE_HORIZON_DAYS", int, "365"),
+    "archive_batch_size": ("ARCHIVE_BATCH_SIZE", int, "500"),
+    # Entitetssider: "server" renderer alle rækker i Jinja, "client" sender en
+    # cachet sideskal og henter rækkerne som JSON; antal cachede fragmenter
+    "render_mode": ("CRM_RENDER_MODE", str, "server"),
+    "fragment_cache_size": ("FRAGMENT_CACHE_SIZE", int, "32"),
+    # Læse-snapshot: kopiér databasen til hukommelsen og læs derfra, antal
+    # sider backup API'et kopierer pr. skridt (mellem skridt kan andre skrive)
+    # og mindste antal sekunder mellem to kopieringer
+    "read_snapshot": ("CRM_READ_SNAPSHOT", _flag, "0"),
+    "snapshot_backup_pages": ("SNAPSHOT_BACKUP_PAGES", int, "1024"),
+    "snapshot_min_interval": ("SNAPSHOT_MIN_INTERVAL", float, "2"),
+    # Tenants: mappe med én databasefil pr. kunde (tom = kun db_path), maks
+    # åbne tenants før de ledige lukkes, samtidige requests pr. tenant og
+    # sekunder en request må vente på en plads (en ventende request optager
+    # en servertråd, så ventetiden holdes kort)
+    "tenants_dir": ("CRM_TENANTS_DIR", str, ""),
+    "tenant_max_open": ("TENANT_MAX_OPEN", int, "64"),
+    "tenant_max_concurrency": ("TENANT_MAX_CONCURRENCY", int, "4"),
+    "tenant_queue_timeout": ("TENANT_QUEUE_TIMEOUT", float, "0.25"),
+    # Fælles hemmelighed som proxyen sender i X-Tenant-Auth (se app.tenants),
+    # og om requests uden tenant må bruge standarddatabasen
+    "tenant_proxy_secret": ("TENANT_PROXY_SECRET", str, ""),
+    "tenant_allow_default": ("TENANT_ALLOW_DEFAULT", _flag, "0"),
+}
+
+
+class Settings:
+    """
+    Samlet konfiguration for CRM systemet.
+
+    Hver værdi læses og konverteres første gang den bruges og caches derefter.
+    API nøglen læses altid frisk, så status og AI tilgængelighed følger
+    miljøet. `reload()` tømmer cachen (fx i tests).
+    """
+
+    def __init__(self):
+        self._env_loaded = False
+        self._lock = threading.Lock()
+
+    def load_env(self):
+        """Indlæs .env filen én gang pr. proces."""
+        if self._env_loaded:
+            return
+        with self._lock:
+            if not self._env_loaded:
+                from dotenv import load_dotenv
+
+                load_dotenv()
+                self._env_loaded = True
+
+    def __getattr__(self, name):
+        if name not in _FIELDS:
+            raise AttributeError(name)
+        env_name, cast, default = _FIELDS[name]
+        self.load_env()
+        value = cast(os.environ.get(env_name, default))
+        self.__dict__[name] = value
+        return value
+
+    @property
+    def openai_api_key(self):
+        """OpenAI API nøglen, eller None hvis den mangler."""
+        self.load_env()
+        key = os.environ.get("OPENAI_API_KEY")
+        if not key or key == API_KEY_PLACEHOLDER:
+            return None
+        return key
+
+    @property
+    def ai_available(self) -> bool:
+        return self.openai_api_key is not None
+
+    def reload(self):
+        """Glem cachede værdier, så de læses fra miljøet igen."""
+        for name in _FIELDS:
+            self.__dict__.pop(name, None)
+
+
+settings = Settings()
+
 
-# OpenAI API key fra environment variable
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+def __getattr__(name):
+    # Bagudkompatible konstanter, fx `from app.config import DB_PATH`
+    if name == "OPENAI_API_KEY":
+        return settings.openai_api_key
+    if name.lower() in _FIELDS:
+        return getattr(settings, name.lower())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
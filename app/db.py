@@ -1,29 +1,334 @@
+import itertools
+import queue
 import sqlite3
-from pathlib import Path
+import threading
+import uuid
+from collections.abc import Mapping, Sequence
+from contextlib import contextmanager
+from contextvars import ContextVar
 
-DB_PATH = Path(__file__).resolve().parent.parent / "data" / "example.db"
+from app.analytics import ensure_analytics
+from app.archive import attach_archive, ensure_hot_index
+from app.config import settings
+from app.dimensions import ensure_dimensions
+
+# Databaser hvor skemaet allerede er tjekket i denne proces
+_schema_checked = set()
+_schema_lock = threading.Lock()
+
+# Vedvarende forbindelser til `PRAGMA data_version` (med et løbenummer, så en
+# genåbnet database aldrig gentager en gammel version) og antal skrivninger
+# udført via run_action, begge pr. databasefil
+_version_connections = {}
+# Tilfældigt id for denne proces: tællerne starter forfra ved en genstart, så
+# uden id'et kunne en ny proces gentage en version (og ETag) for andre data
+_BOOT_ID = uuid.uuid4().hex[:12]
+_write_counts = {}
+_version_lock = threading.Lock()
+_version_epochs = itertools.count(1)
+# Senest sete `PRAGMA data_version` pr. databasefil
+_seen_versions = {}
+
+# Funktioner der kaldes efter hver skrivning via run_action
+_write_listeners = []
+
+# Forbindelsespuljer pr. databasefil
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Databasefilen for den aktuelle request når den ikke er settings.db_path
+# (sættes pr. tenant af app.tenants)
+_current_path = ContextVar("crm_db_path", default=None)
+
+
+def current_db_path():
+    """Databasefilen der arbejdes på: den aktuelle tenants eller settings.db_path."""
+    return _current_path.get() or settings.db_path
+
+
+@contextmanager
+def use_database(path):
+    """Lad `app.db` arbejde mod `path` i blokken (og tråde der arver konteksten)."""
+    token = _current_path.set(path)
+    try:
+        yield
+    finally:
+        _current_path.reset(token)
+
+
+def ensure_schema(conn, path=None):
+    """Sørg for at afledte tabeller, kolonner og triggers findes (én gang pr. fil)."""
+    key = str(path or current_db_path())
+    if key in _schema_checked:
+        return
+    with _schema_lock:
+        if key not in _schema_checked:
+            ensure_dimensions(conn)
+            ensure_hot_index(conn)
+            ensure_analytics(conn)
+            _schema_checked.add(key)
 
 
 def get_connection():
     """Åbn en forbindelse til SQLite databasen."""
-    return sqlite3.connect(DB_PATH)
+    path = current_db_path()
+    conn = sqlite3.connect(path)
+    ensure_schema(conn, path)
+    attach_archive(conn, path)
+    return conn
+
+
+class ConnectionPool:
+    """
+    Genbruger åbne SQLite forbindelser mellem requests og tråde.
+
+    Op til `size` ledige forbindelser holdes åbne. Er puljen tom, åbnes en ny
+    forbindelse, og overskydende forbindelser lukkes når de afleveres.
+    """
+
+    def __init__(self, path, size=None):
+        self.path = path
+        self.size = size or settings.db_pool_size
+        self._idle = queue.LifoQueue(maxsize=self.size)
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            cached_statements=settings.sqlite_statement_cache,
+        )
+        ensure_schema(conn, self.path)
+        # Gamle aktiviteter ligger i arkivfilen (se app.archive)
+        attach_archive(conn, self.path)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Lån en forbindelse; den afleveres automatisk bagefter."""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def close(self):
+        """Luk alle ledige forbindelser."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def get_pool(path=None) -> ConnectionPool:
+    """Returnerer forbindelsespuljen for `path` (standard: den aktuelle database)."""
+    path = path or current_db_path()
+    key = str(path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(path)
+        return pool
+
+
+class Row(Mapping):
+    """
+    Read-only dict-visning af én række i et ResultSet.
+
+    Oprettes først når rækken tilgås og deler kolonneindekset med resten af
+    resultatet, så kolonnenavne ikke gentages pr. række.
+    """
+
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index, values):
+        self._index = index
+        self._values = values
+
+    def __getitem__(self, key):
+        return self._values[self._index[key]]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ResultSet(Sequence):
+    """
+    Kompakt resultat: kolonnenavne én gang plus en tuple pr. række.
+
+    Opfører sig som en liste af dicts (indeksering, iteration, `len`,
+    sammenligning), så templates og eksisterende kode virker uændret.
+    `to_wire()` giver det kompakte JSON format til API'erne.
+    """
+
+    __slots__ = ("columns", "rows", "_index")
+
+    def __init__(self, columns, rows):
+        self.columns = tuple(columns)
+        self.rows = rows
+        # Ved dublerede kolonnenavne vinder den sidste, som med dict(sqlite3.Row)
+        self._index = {name: i for i, name in enumerate(self.columns)}
+
+    @classmethod
+    def from_cursor(cls, cursor):
+        rows = cursor.fetchall()
+        columns = [d[0] for d in cursor.description or ()]
+        return cls(columns, rows)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return ResultSet(self.columns, self.rows[i])
+        return Row(self._index, self.rows[i])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __eq__(self, other):
+        if isinstance(other, ResultSet):
+            return self.columns == other.columns and self.rows == other.rows
+        if isinstance(other, list):
+            return self.to_dicts() == other
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(self.to_dicts())
+
+    def to_dicts(self):
+        """Returnerer rækkerne som almindelige dicts (fx til sessionen)."""
+        return [dict(row) for row in self]
+
+    def to_wire(self):
+        """Kompakt JSON format: `{"columns": [...], "rows": [[...], ...]}`."""
+        # Tuples serialiseres som JSON arrays, så rækkerne kopieres ikke
+        return {"columns": list(self.columns), "rows": self.rows}
+
+
+def json_default(obj):
+    """`default` til JSON serialisering af ResultSet og Row."""
+    if isinstance(obj, ResultSet):
+        return obj.to_wire()
+    if isinstance(obj, Row):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _read_connection():
+    # Læse-snapshottet i hukommelsen bruges når det er slået til (app.snapshot)
+    if settings.read_snapshot:
+        from app.snapshot import get_snapshot
+
+        return get_snapshot().connection()
+    return get_pool().connection()
 
 
 def run_query(query: str, params: tuple = ()):
-    """Kør en SELECT query og returner resultater som liste af dicts."""
-    conn = get_connection()
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute(query, params)
-    rows = cur.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    """Kør en SELECT query og returner resultatet som et kompakt ResultSet."""
+    with _read_connection() as conn:
+        cur = conn.execute(query, params)
+        return ResultSet.from_cursor(cur)
 
 
 def run_action(query: str, params: tuple = ()):
     """Kør en INSERT/UPDATE/DELETE query."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(query, params)
-    conn.commit()
-    conn.close()
+    with get_pool().connection() as conn:
+        cur = conn.cursor()
+        cur.execute(query, params)
+        conn.commit()
+    with _version_lock:
+        key = str(current_db_path())
+        _write_counts[key] = _write_counts.get(key, 0) + 1
+    _notify_writes(key)
+
+
+def _notify_writes(key):
+    for listener in list(_write_listeners):
+        try:
+            listener(key)
+        except Exception as e:
+            print(f"⚠️ Write listener fejlede: {e}")
+
+
+def add_write_listener(listener):
+    """
+    Registrér en funktion der kaldes efter hver skrivning.
+
+    Funktionen får databasefilen (som str) der er skrevet til, så lyttere
+    for én database (fx én tenant) kan ignorere de andres skrivninger.
+    """
+    _write_listeners.append(listener)
+
+
+def remove_write_listener(listener):
+    """Afregistrér en funktion fra add_write_listener."""
+    try:
+        _write_listeners.remove(listener)
+    except ValueError:
+        pass
+
+
+def data_version(path=None) -> str:
+    """
+    Returnerer en version af databasens indhold som ændrer sig ved hver skrivning.
+
+    Versionen kombinerer `PRAGMA data_version` fra en vedvarende forbindelse
+    (fanger commits fra alle andre forbindelser og processer) med antallet af
+    skrivninger via run_action og et id for processen, så versioner aldrig
+    gentages efter en genstart. Den læser ingen tabeller og er derfor billig
+    nok til at kalde på hver request.
+
+    Ser den en ændring fra en anden proces (fx `python -m app.archive`),
+    kaldes skrivelytterne, så læse-snapshottet er markeret forældet før
+    kalderen læser data og cacher dem under den nye version.
+
+    Args:
+        path (optional): Databasefil; standard er den aktuelle database
+    """
+    path = path or current_db_path()
+    key = str(path)
+    with _version_lock:
+        entry = _version_connections.get(key)
+        if entry is None:
+            conn = sqlite3.connect(path, check_same_thread=False)
+            ensure_schema(conn, path)
+            entry = _version_connections[key] = (conn, next(_version_epochs))
+        conn, epoch = entry
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        changed = _seen_versions.get(key, version) != version
+        _seen_versions[key] = version
+        result = f"{_BOOT_ID}.{epoch}.{version}.{_write_counts.get(key, 0)}"
+    if changed:
+        _notify_writes(key)
+    return result
+
+
+def close_database(path):
+    """
+    Lukker puljen og versionsforbindelsen for `path` (fx når en tenant er ledig).
+
+    Databasen åbnes igen automatisk ved næste brug.
+    """
+    key = str(path)
+    with _pools_lock:
+        pool = _pools.pop(key, None)
+    if pool is not None:
+        pool.close()
+    with _version_lock:
+        entry = _version_connections.pop(key, None)
+        _write_counts.pop(key, None)
+        _seen_versions.pop(key, None)
+    if entry is not None:
+        entry[0].close()
@@ -0,0 +1,205 @@
+"""
+Support Solutions CRM - Geografi og branche dimensioner
+======================================================
+
+Opslagstabeller der erstatter lange `city LIKE ... OR ...` kæder i prompten.
+Hver kunde får et indekseret `region_id` og `industry_group`, som holdes
+opdateret af triggers ved INSERT/UPDATE, så AI'en kan bruge simple
+lighedsbetingelser og JOINs.
+"""
+
+import sqlite3
+
+# Regioner som postnummer-intervaller. `landsdel` samler regionerne til
+# "Jylland", "Sjælland" og "Fyn".
+REGIONS = [
+    # (id, name, landsdel, postal_from, postal_to)
+    (1, "Hovedstaden", "Sjælland", 1000, 2999),
+    (2, "Sjælland", "Sjælland", 3000, 4999),
+    (3, "Fyn", "Fyn", 5000, 5999),
+    (4, "Midtjylland", "Jylland", 6000, 8999),
+    (5, "Nordjylland", "Jylland", 9000, 9999),
+]
+
+# Bynavne bruges når en kunde mangler postnummer
+REGION_CITIES = {
+    "København": 1,
+    "Copenhagen": 1,
+    "Frederiksberg": 1,
+    "Helsingør": 2,
+    "Køge": 2,
+    "Roskilde": 2,
+    "Næstved": 2,
+    "Odense": 3,
+    "Svendborg": 3,
+    "Nyborg": 3,
+    "Aarhus": 4,
+    "Esbjerg": 4,
+    "Kolding": 4,
+    "Vejle": 4,
+    "Randers": 4,
+    "Horsens": 4,
+    "Herning": 4,
+    "Silkeborg": 4,
+    "Fredericia": 4,
+    "Viborg": 4,
+    "Aalborg": 5,
+    "Hjørring": 5,
+    "Frederikshavn": 5,
+}
+
+# Rå branchenavne -> normaliseret branchegruppe. Ukendte brancher beholder
+# deres eget navn som gruppe.
+INDUSTRY_GROUPS = {
+    "Bank": "Finans",
+    "Finance": "Finans",
+    "Finans": "Finans",
+    "Forsikring": "Finans",
+    "Insurance": "Finans",
+    "Technology": "Teknologi",
+    "IT": "Teknologi",
+    "Software": "Teknologi",
+    "Healthcare": "Sundhed",
+    "Sundhed": "Sundhed",
+    "Public": "Offentlig",
+    "Public Sector": "Offentlig",
+    "Offentlig": "Offentlig",
+    "Retail": "Handel",
+    "Handel": "Handel",
+    "Energy": "Energi",
+    "Logistics": "Logistik",
+    "Education": "Uddannelse",
+    "Consulting": "Rådgivning",
+}
+
+DIMENSION_TABLES_SQL = """
+CREATE TABLE IF NOT EXISTS regions (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    landsdel TEXT NOT NULL,
+    postal_from INTEGER NOT NULL,
+    postal_to INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS region_cities (
+    city TEXT PRIMARY KEY COLLATE NOCASE,
+    region_id INTEGER NOT NULL REFERENCES regions(id)
+);
+CREATE TABLE IF NOT EXISTS industry_groups (
+    industry TEXT PRIMARY KEY COLLATE NOCASE,
+    industry_group TEXT NOT NULL
+);
+"""
+
+# Udtryk der slår en kundes dimensioner op ud fra NEW-rækken i en trigger
+_REGION_LOOKUP = """COALESCE(
+        (SELECT id FROM regions
+         WHERE CAST(NEW.postal_code AS INTEGER) BETWEEN postal_from AND postal_to),
+        (SELECT region_id FROM region_cities WHERE city = TRIM(NEW.city))
+    )"""
+_INDUSTRY_LOOKUP = """COALESCE(
+        (SELECT industry_group FROM industry_groups
+         WHERE industry = TRIM(NEW.industry)),
+        NEW.industry
+    )"""
+
+DIMENSION_TRIGGERS_SQL = f"""
+CREATE INDEX IF NOT EXISTS idx_customers_region_id ON customers(region_id);
+CREATE INDEX IF NOT EXISTS idx_customers_industry_group
+    ON customers(industry_group);
+
+CREATE TRIGGER IF NOT EXISTS customers_dimensions_insert
+AFTER INSERT ON customers
+BEGIN
+    UPDATE customers SET
+        region_id = {_REGION_LOOKUP},
+        industry_group = {_INDUSTRY_LOOKUP}
+    WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS customers_dimensions_update
+AFTER UPDATE OF city, postal_code, industry ON customers
+BEGIN
+    UPDATE customers SET
+        region_id = {_REGION_LOOKUP},
+        industry_group = {_INDUSTRY_LOOKUP}
+    WHERE id = NEW.id;
+END;
+"""
+
+
+def _columns(conn, table: str) -> set:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def execute_statements(conn, script: str):
+    """
+    Kører et SQL script statement for statement i den aktuelle transaktion.
+
+    `executescript()` committer en igangværende transaktion først, så den kan
+    ikke bruges i en atomisk migrering.
+    """
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ""
+
+
+def _is_installed(conn) -> bool:
+    return {"region_id", "industry_group"} <= _columns(conn, "customers") and bool(
+        _columns(conn, "regions")
+    )
+
+
+def ensure_dimensions(conn):
+    """
+    Opretter dimensionstabeller, kolonner, indekser og triggers hvis de mangler.
+
+    Funktionen er idempotent og skriver kun til databasen første gang den køres
+    mod en ny database. Eksisterende kunder udfyldes (backfill) når kolonnerne
+    tilføjes.
+
+    Args:
+        conn (sqlite3.Connection): Åben forbindelse til CRM databasen
+    """
+    if "customers" not in {
+        row[0] for row in conn.execute("SELECT name FROM sqlite_master")
+    }:
+        return
+
+    if _is_installed(conn):
+        return
+
+    with conn:
+        # Lås databasen og tjek igen, så to processer ikke migrerer samtidig
+        conn.execute("BEGIN IMMEDIATE")
+        if _is_installed(conn):
+            return
+        columns = _columns(conn, "customers")
+        execute_statements(conn, DIMENSION_TABLES_SQL)
+        conn.executemany(
+            "INSERT OR IGNORE INTO regions "
+            "(id, name, landsdel, postal_from, postal_to) VALUES (?, ?, ?, ?, ?)",
+            REGIONS,
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO region_cities (city, region_id) VALUES (?, ?)",
+            REGION_CITIES.items(),
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO industry_groups (industry, industry_group) "
+            "VALUES (?, ?)",
+            INDUSTRY_GROUPS.items(),
+        )
+        if "region_id" not in columns:
+            conn.execute(
+                "ALTER TABLE customers ADD COLUMN region_id INTEGER "
+                "REFERENCES regions(id)"
+            )
+        if "industry_group" not in columns:
+            conn.execute("ALTER TABLE customers ADD COLUMN industry_group TEXT")
+        execute_statements(conn, DIMENSION_TRIGGERS_SQL)
+
+        # Backfill: genbrug trigger-logikken ved at "røre" de relevante kolonner
+        conn.execute("UPDATE customers SET industry = industry")
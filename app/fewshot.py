@@ -0,0 +1,247 @@
+"""
+Support Solutions CRM - Dynamiske few-shot eksempler
+====================================================
+
+Lokalt søgeindeks over spørgsmål -> SQL par der er kørt med succes. I stedet
+for altid at sende alle faste eksempler med i prompten vælges de par, hvis
+spørgsmål ligner det nye mest. Ligheden måles med TF-IDF over tegn-trigrammer,
+så bøjninger og sammensatte danske ord ("finanskunder", "kunder i Aarhus")
+stadig matcher uden stemming eller eksterne afhængigheder.
+
+De faste eksempler (SEED_EXAMPLES) ligger i deres eget indeks, som lærte par
+aldrig ændrer. Lærte par kommer fra brugernes spørgsmål og ender i senere
+prompts, så spørgsmålet forkortes og gøres til én linje uden anførselstegn,
+før det gemmes. Hver database (fx hver tenant) har sine egne lærte par;
+nøglen gives af kalderen (`app.agent`).
+"""
+
+import heapq
+import math
+import threading
+from collections import Counter, OrderedDict
+from operator import itemgetter
+
+from app.config import settings
+from app.prompt import SEED_EXAMPLES
+from app.sqlrepair import is_read_only
+
+# Maks længde af et lært spørgsmål og dets SQL i prompten
+MAX_QUESTION_CHARS = 200
+MAX_SQL_CHARS = 2000
+
+
+def normalize(question: str) -> str:
+    """Små bogstaver, enkelt mellemrum og uden afsluttende tegnsætning."""
+    return " ".join((question or "").lower().split()).rstrip("?. ")
+
+
+def trigrams(text: str) -> Counter:
+    """Tæller tegn-trigrammer; hvert ord polstres så ordgrænser tæller med."""
+    grams = Counter()
+    for word in text.split():
+        padded = f" {word} "
+        grams.update(map("".join, zip(padded, padded[1:], padded[2:])))
+    return grams
+
+
+class _Entry:
+    __slots__ = ("question", "sql", "weights", "pinned")
+
+    def __init__(self, question, sql, weights, pinned):
+        self.question = question
+        self.sql = sql
+        self.weights = weights
+        self.pinned = pinned
+
+
+class ExampleIndex:
+    """
+    Begrænset, trådsikkert indeks over (spørgsmål, SQL) par.
+
+    Dokumenterne gemmes som L2-normaliserede trigram-frekvenser i et
+    inverteret indeks (trigram -> {nøgle: vægt}). IDF vægten lægges på
+    forespørgslen ved søgning, så nye par kan tilføjes og gamle fjernes uden
+    at genberegne de øvrige vektorer. Når indekset er fuldt, fjernes det par
+    der har været mindst brugt for nylig; faste eksempler (`pinned`) bliver.
+
+    Args:
+        maxsize (int): Maks antal par i indekset
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._postings = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def add(self, question: str, sql: str, pinned: bool = False):
+        """Tilføjer eller opdaterer et par. Samme spørgsmål erstatter det gamle."""
+        key = normalize(question)
+        grams = trigrams(key)
+        if not grams or not sql:
+            return
+        norm = math.sqrt(sum(count * count for count in grams.values()))
+        weights = {gram: count / norm for gram, count in grams.items()}
+
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None:
+                self._remove(key)
+                pinned = pinned or previous.pinned
+            self._entries[key] = _Entry(question.strip(), sql, weights, pinned)
+            for gram, weight in weights.items():
+                self._postings.setdefault(gram, {})[key] = weight
+            self._evict()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for gram in entry.weights:
+            posting = self._postings[gram]
+            del posting[key]
+            if not posting:
+                del self._postings[gram]
+
+    def _evict(self):
+        if len(self._entries) <= self.maxsize:
+            return
+        for key in [k for k, e in self._entries.items() if not e.pinned]:
+            if len(self._entries) <= self.maxsize:
+                break
+            self._remove(key)
+
+    def search(self, question: str, k: int = 4, min_score: float = 0.0):
+        """
+        Finder de k par hvis spørgsmål ligner `question` mest.
+
+        Args:
+            question (str): Nyt spørgsmål i naturligt sprog
+            k (int): Maks antal resultater
+            min_score (float): Laveste cosinus-lighed der medtages
+
+        Returns:
+            list[tuple[str, str, float]]: (spørgsmål, SQL, score), bedste først
+        """
+        grams = trigrams(normalize(question))
+        if not grams or k <= 0:
+            return []
+
+        with self._lock:
+            total = len(self._entries)
+            query = {}
+            for gram, count in grams.items():
+                posting = self._postings.get(gram)
+                if posting:
+                    # Glattet IDF: sjældne trigrammer vejer tungest
+                    query[gram] = count * (1 + math.log(total / len(posting)))
+            if not query:
+                return []
+            norm = math.sqrt(sum(w * w for w in query.values()))
+
+            scores = {}
+            get = scores.get
+            for gram, weight in query.items():
+                for key, doc_weight in self._postings[gram].items():
+                    scores[key] = get(key, 0.0) + weight * doc_weight
+
+            results = []
+            for key, score in heapq.nlargest(k, scores.items(), key=itemgetter(1)):
+                score /= norm
+                if score < min_score:
+                    break
+                entry = self._entries[key]
+                self._entries.move_to_end(key)
+                results.append((entry.question, entry.sql, round(score, 4)))
+            return results
+
+
+_seeds = None
+_learned = {}
+_index_lock = threading.Lock()
+
+
+def clean_question(question: str) -> str:
+    """
+    Gør et brugerspørgsmål sikkert at vise som eksempel i prompten.
+
+    Linjeskift og gentagne mellemrum samles, anførselstegn og pilen der
+    adskiller spørgsmål og SQL fjernes, og teksten forkortes til
+    MAX_QUESTION_CHARS.
+    """
+    text = " ".join((question or "").split())
+    text = text.replace('"', "'").replace("→", "->")
+    return text[:MAX_QUESTION_CHARS].strip()
+
+
+def get_seed_index() -> ExampleIndex:
+    """Indekset med SEED_EXAMPLES fra app.prompt (fælles og uændret)."""
+    global _seeds
+    if _seeds is None:
+        with _index_lock:
+            if _seeds is None:
+                seeds = ExampleIndex(len(SEED_EXAMPLES))
+                for question, sql in SEED_EXAMPLES:
+                    seeds.add(question, sql, pinned=True)
+                _seeds = seeds
+    return _seeds
+
+
+def get_example_index(key) -> ExampleIndex:
+    """
+    De lærte par for `key` (fx databasefilen), så én kundes spørgsmål ikke
+    bruges som eksempler for en anden.
+    """
+    key = str(key)
+    with _index_lock:
+        index = _learned.get(key)
+        if index is None:
+            index = _learned[key] = ExampleIndex(settings.fewshot_index_size)
+        return index
+
+
+def learn(key, question: str, sql: str):
+    """
+    Gemmer et par der er kørt med succes som fremtidigt eksempel for `key`.
+
+    Kalderen sikrer at forespørgslen gav rækker; SQL der ikke kun læser
+    gemmes aldrig. Spørgsmålet renses med `clean_question`, og SQL'en samles
+    på én linje. SQL med kommentarer gemmes heller ikke - de kan bære tekst
+    til modellen, og på én linje ville en `--` kommentar skjule resten af
+    forespørgslen.
+    """
+    sql = " ".join((sql or "").split())
+    if len(sql) > MAX_SQL_CHARS or "--" in sql or "/*" in sql:
+        return
+    if not is_read_only(sql):
+        return
+    get_example_index(key).add(clean_question(question), sql)
+
+
+def discard(key):
+    """Glem de lærte par for `key` (fx når en tenant lukkes)."""
+    with _index_lock:
+        _learned.pop(str(key), None)
+
+
+def select_examples(question: str, key=None, k: int = None):
+    """
+    Vælger few-shot eksempler til et spørgsmål blandt de faste eksempler og
+    de lærte par for `key`.
+
+    Returns:
+        list[tuple[str, str]]: (spørgsmål, SQL) par, mest lignende først
+    """
+    k = settings.fewshot_examples if k is None else k
+    min_score = settings.fewshot_min_score
+    hits = get_seed_index().search(question, k=k, min_score=min_score)
+    if key is not None:
+        seen = {normalize(q) for q, _, _ in hits}
+        learned = get_example_index(key).search(question, k=k, min_score=min_score)
+        # Et lært par med samme spørgsmål som et fast eksempel bruges ikke
+        hits += [hit for hit in learned if normalize(hit[0]) not in seen]
+    # Stabil sortering: ved samme score vinder det faste eksempel
+    hits.sort(key=itemgetter(2), reverse=True)
+    return [(q, sql) for q, sql, _ in hits[:k]]
@@ -0,0 +1,67 @@
+"""
+Support Solutions CRM - Fragment cache
+=====================================
+
+Renderede fragmenter (sideskaller med statistikkort, JSON med rækker) caches
+pr. databaseversion. Så længe data ikke ændrer sig, koster en sidevisning kun
+et opslag; første request efter en skrivning renderer fragmentet igen.
+
+Der gemmes kun fragmenter for den nyeste version af hver database - JSON med
+alle rækker kan være mange MB, så gamle versioner smides ud med det samme i
+stedet for at vente på LRU'en.
+"""
+
+import threading
+
+from app.cache import LRUCache
+from app.config import settings
+from app.db import current_db_path, data_version
+
+# Databasefil -> (version, LRUCache med fragmenter for den version)
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def _cache_for(path, version) -> LRUCache:
+    with _caches_lock:
+        current = _caches.get(path)
+        if current is None or current[0] != version:
+            current = _caches[path] = (
+                version,
+                LRUCache(maxsize=settings.fragment_cache_size),
+            )
+        return current[1]
+
+
+def cached_fragment(key: tuple, render):
+    """
+    Returnerer fragmentet for `key` ved den aktuelle databaseversion.
+
+    Versionen læses før `render()` kaldes, så en skrivning under renderingen
+    blot giver et cache-miss på næste request i stedet for et forældet svar.
+
+    Args:
+        key (tuple): Identificerer fragmentet, fx ("customers", "page", dato)
+        render (callable): Laver fragmentet når det ikke er cachet
+
+    Returns:
+        Det cachede fragment eller resultatet af `render()`
+    """
+    cache = _cache_for(str(current_db_path()), data_version())
+    fragment = cache.get(key)
+    if fragment is None:
+        fragment = render()
+        cache.put(key, fragment)
+    return fragment
+
+
+def discard(path):
+    """Glem fragmenterne for én databasefil."""
+    with _caches_lock:
+        _caches.pop(str(path), None)
+
+
+def clear():
+    """Tøm fragment cachen (fx i tests)."""
+    with _caches_lock:
+        _caches.clear()
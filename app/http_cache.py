@@ -0,0 +1,180 @@
+"""
+Support Solutions CRM - HTTP caching og komprimering
+===================================================
+
+ETags afledt af databaseversionen, så polling-endpoints kan svare
+`304 Not Modified` uden at røre databasen, samt gzip/brotli komprimering
+af store svar. Svar med en ETag komprimeres kun én gang pr. kodning; de
+komprimerede bytes genbruges til alle klienter indtil data ændrer sig.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+from app.cache import LRUCache
+from app.config import settings
+from app.db import current_db_path, data_version
+
+try:
+    import brotli
+except ImportError:  # brotli er valgfri - gzip bruges ellers
+    brotli = None
+
+# Standardværdier - kan overskrives via app.config
+COMPRESS_MIN_SIZE = 1024
+COMPRESS_LEVEL = 6
+COMPRESSIBLE_MIMETYPES = {
+    "text/html",
+    "text/css",
+    "text/plain",
+    "application/json",
+    "application/javascript",
+}
+
+# (ETag, kodning, niveau, længde) -> komprimerede bytes
+_compressed = None
+_compressed_lock = threading.Lock()
+
+
+def current_etag(*extra) -> str:
+    """
+    Beregner ETag for den aktuelle request ud fra databaseversionen.
+
+    Versionen indeholder et id for processen, og databasefilens identitet
+    (enhed og inode) kommer med, så en ETag fra før en genstart eller fra en
+    udskiftet databasefil aldrig giver et forkert 304.
+
+    Args:
+        *extra: Ekstra værdier som svaret afhænger af (fx AI tilgængelighed)
+
+    Returns:
+        str: Hex digest der kan bruges som (svag) ETag
+    """
+    stat = os.stat(current_db_path())
+    key = "|".join(
+        [
+            data_version(),
+            f"{stat.st_dev}:{stat.st_ino}",
+            request.full_path,
+            *map(str, extra),
+        ]
+    )
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def conditional(vary=None):
+    """
+    Decorator der svarer 304 når klientens ETag matcher databaseversionen.
+
+    View-funktionen kaldes kun når data har ændret sig. Svar med anden status
+    end 200 får ingen ETag, så fejl aldrig caches.
+
+    Args:
+        vary (callable, optional): Returnerer ekstra værdier til ETag'en
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                etag = current_etag(*(vary() if vary else ()))
+            except Exception:
+                # Databasen er utilgængelig - lad view'et håndtere fejlen
+                return view(*args, **kwargs)
+
+            if request.if_none_match.contains_weak(etag):
+                response = make_response("", 304)
+                response.set_etag(etag, weak=True)
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag, weak=True)
+                response.headers["Cache-Control"] = "no-cache"
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress_response(response):
+    """
+    Komprimerer svaret med brotli eller gzip hvis klienten understøtter det.
+
+    Kun færdige (ikke-streamede) svar over `COMPRESS_MIN_SIZE` bytes med en
+    tekstbaseret mimetype komprimeres.
+    """
+    min_size = current_app.config.get("COMPRESS_MIN_SIZE", COMPRESS_MIN_SIZE)
+    level = current_app.config.get("COMPRESS_LEVEL", COMPRESS_LEVEL)
+
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = _choose_encoding()
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    etag, _ = response.get_etag()
+    if etag is None:
+        data = _compress(data, encoding, level)
+    else:
+        # Samme ETag betyder samme data - komprimér kun første gang
+        key = (etag, encoding, level, len(data))
+        cache = _compressed_cache()
+        compressed = cache.get(key)
+        if compressed is None:
+            compressed = _compress(data, encoding, level)
+            cache.put(key, compressed)
+        data = compressed
+
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def _compress(data, encoding, level):
+    if encoding == "br":
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=level)
+
+
+def _compressed_cache() -> LRUCache:
+    global _compressed
+    if _compressed is None:
+        with _compressed_lock:
+            if _compressed is None:
+                _compressed = LRUCache(maxsize=settings.fragment_cache_size)
+    return _compressed
+
+
+def init_app(app):
+    """Registrerer komprimering på Flask applikationen."""
+    app.config.setdefault("COMPRESS_MIN_SIZE", COMPRESS_MIN_SIZE)
+    app.config.setdefault("COMPRESS_LEVEL", COMPRESS_LEVEL)
+    app.after_request(compress_response)
@@ -0,0 +1,182 @@
+"""
+Support Solutions CRM - Live dashboard opdateringer
+==================================================
+
+Server-Sent Events (SSE) kanal til dashboardet. Statistikken beregnes én gang
+pr. ændring og sendes ud til alle abonnenter, så databasebelastningen følger
+antallet af skrivninger i stedet for antallet af åbne browsere.
+"""
+
+import contextvars
+import json
+import queue
+import threading
+import time
+
+from app.config import settings
+from app.db import (
+    add_write_listener,
+    data_version,
+    json_default,
+    remove_write_listener,
+)
+
+# Standardværdier for opdateringsløkken
+DEBOUNCE_SECONDS = 0.25
+POLL_SECONDS = 2.0
+KEEPALIVE_SECONDS = 15.0
+
+
+class LiveDashboard:
+    """
+    Beregner dashboard data ved ændringer og fordeler dem til abonnenter.
+
+    Opdateringstråden kører kun mens der er abonnenter. Skrivninger via
+    `app.db.run_action` vækker den direkte.
+    Ændringer fra andre processer opdages ved at tjekke `data_version` hvert
+    `poll_seconds`. Flere skrivninger inden for `debounce_seconds` samles til
+    én genberegning. `path` er databasefilen dashboardet viser (standard
+    settings.db_path); skrivninger til andre filer, fx andre tenants,
+    ignoreres.
+    """
+
+    def __init__(
+        self,
+        compute,
+        debounce_seconds=DEBOUNCE_SECONDS,
+        poll_seconds=POLL_SECONDS,
+        path=None,
+    ):
+        self.compute = compute
+        self.path = path
+        self.debounce_seconds = debounce_seconds
+        self.poll_seconds = poll_seconds
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._compute_lock = threading.Lock()
+        self._changed = threading.Event()
+        self._thread = None
+        self._latest = None
+        self._latest_version = None
+        self._published_version = None
+        self._closed = False
+        add_write_listener(self.notify)
+
+    def notify(self, path=None):
+        """Markér at data har ændret sig (kaldes efter hver skrivning)."""
+        if path is not None and path != str(self.path or settings.db_path):
+            return
+        self._changed.set()
+
+    def latest(self):
+        """Returnerer seneste payload og beregner den hvis data er ændret."""
+        return self._latest_with_version()[0]
+
+    def _latest_with_version(self):
+        version = data_version()
+        with self._compute_lock:
+            # Kun én tråd beregner; de andre genbruger resultatet
+            with self._lock:
+                if self._latest is not None and self._latest_version == version:
+                    return self._latest, version
+            payload = self.compute()
+            with self._lock:
+                self._latest, self._latest_version = payload, version
+            return payload, version
+
+    def subscribe(self):
+        """Opretter en kø der modtager hver ny payload."""
+        # maxsize=1: langsomme klienter får kun den nyeste version
+        subscriber = queue.Queue(maxsize=1)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                # Tråden arver konteksten, dvs. den aktuelle tenants database
+                self._thread = threading.Thread(
+                    target=contextvars.copy_context().run,
+                    args=(self._run,),
+                    name="live-dashboard",
+                    daemon=True,
+                )
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            if not self._subscribers:
+                # Væk tråden, så den stopper uden at vente på næste poll
+                self._changed.set()
+
+    def publish(self, payload):
+        """Sender payload til alle abonnenter og erstatter ulæste beskeder."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                subscriber.put_nowait(payload)
+            except queue.Full:
+                pass
+
+    def refresh(self):
+        """Genberegner payload hvis data er ændret og sender den ud."""
+        payload, version = self._latest_with_version()
+        with self._lock:
+            if version == self._published_version:
+                return
+            self._published_version = version
+        self.publish(payload)
+
+    def close(self):
+        """Stopper opdateringstråden og afregistrerer skrivelytteren."""
+        self._closed = True
+        remove_write_listener(self.notify)
+        self._changed.set()
+
+    def _run(self):
+        while not self._closed:
+            woken = self._changed.wait(timeout=self.poll_seconds)
+            if woken:
+                # Saml efterfølgende skrivninger til én beregning
+                time.sleep(self.debounce_seconds)
+                self._changed.clear()
+            with self._lock:
+                if not self._subscribers:
+                    # Ingen lyttere: stop tråden; subscribe starter en ny
+                    self._thread = None
+                    return
+                if self._closed:
+                    continue
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"⚠️ Live dashboard opdatering fejlede: {e}")
+
+    def events(self, keepalive_seconds=KEEPALIVE_SECONDS):
+        """
+        Generator med SSE beskeder til én klient.
+
+        Første besked er den aktuelle tilstand; derefter sendes en besked pr.
+        ændring og en kommentar som keepalive når der ikke sker noget.
+        """
+        subscriber = self.subscribe()
+        try:
+            yield format_event(self.latest())
+            while True:
+                try:
+                    payload = subscriber.get(timeout=keepalive_seconds)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_event(payload)
+        finally:
+            self.unsubscribe(subscriber)
+
+
+def format_event(payload, event="dashboard") -> str:
+    """Formaterer payload som en SSE besked."""
+    return f"event: {event}\ndata: {json.dumps(payload, default=json_default)}\n\n"
@@ -0,0 +1,231 @@
+"""
+Support Solutions CRM - Robust LLM klient
+========================================
+
+Wrapper om OpenAI klienten med deadline pr. kald, retries med jittered
+exponential backoff, circuit breaker og valgfrie hedged requests. Når
+udbyderen er nede, fejler kald hurtigt i stedet for at blokere Flask
+workers, så resten af CRM'et bliver ved med at svare.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    CancelledError,
+    ThreadPoolExecutor,
+    wait,
+)
+
+from app.config import settings
+
+# Tråde til hedged requests (deles af alle klienter i processen; antallet
+# styres af LLM_HEDGE_WORKERS og oprettes ved første hedgede kald)
+_hedge_executor = None
+_hedge_lock = threading.Lock()
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _hedge_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(
+                    max_workers=settings.llm_hedge_workers,
+                    thread_name_prefix="llm-hedge",
+                )
+    return _hedge_executor
+
+
+class CircuitOpenError(RuntimeError):
+    """Kaldet blev afvist fordi circuit breakeren er åben."""
+
+
+class CircuitBreaker:
+    """
+    Klassisk closed/open/half-open circuit breaker.
+
+    Efter `failure_threshold` fejl i træk åbner breakeren, og kald afvises med
+    det samme i `reset_seconds`. Derefter slippes ét prøvekald igennem
+    (half-open); lykkes det, lukkes breakeren igen.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, failure_threshold=None, reset_seconds=None):
+        self.failure_threshold = failure_threshold or settings.llm_breaker_threshold
+        self.reset_seconds = (
+            settings.llm_breaker_reset if reset_seconds is None else reset_seconds
+        )
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        """Returnerer True hvis et kald må forsøges nu."""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, forbindelsesfejl, 429 og 5xx er forbigående og prøves igen."""
+    import openai
+
+    if isinstance(error, (openai.APIConnectionError, TimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class ResilientClient:
+    """
+    Kalder `chat.completions.create` med deadline, retries, breaker og hedging.
+
+    Parametre der udelades hentes fra `settings` (LLM_* miljøvariablerne).
+
+    Args:
+        client: OpenAI klient (bør være oprettet med `max_retries=0`)
+        timeout (float): Timeout i sekunder for hvert enkelt forsøg
+        deadline (float): Samlet tidsbudget for kaldet inkl. retries
+        max_retries (int): Antal ekstra forsøg ved forbigående fejl
+        hedge_delay (float): Send et duplikat-kald hvis første forsøg ikke har
+            svaret efter så mange sekunder. 0 slår hedging fra.
+        breaker (CircuitBreaker, optional): Delt circuit breaker
+    """
+
+    def __init__(
+        self,
+        client,
+        timeout=None,
+        deadline=None,
+        max_retries=None,
+        backoff_base=None,
+        backoff_max=None,
+        hedge_delay=None,
+        breaker=None,
+    ):
+        def setting(value, name):
+            return getattr(settings, name) if value is None else value
+
+        self.client = client
+        self.timeout = setting(timeout, "llm_timeout")
+        self.deadline = setting(deadline, "llm_deadline")
+        self.max_retries = setting(max_retries, "llm_max_retries")
+        self.backoff_base = setting(backoff_base, "llm_backoff_base")
+        self.backoff_max = setting(backoff_max, "llm_backoff_max")
+        self.hedge_delay = setting(hedge_delay, "llm_hedge_delay")
+        self.breaker = breaker or CircuitBreaker()
+
+    def chat(self, **kwargs):
+        """
+        Kalder chat completions og returnerer svaret.
+
+        Raises:
+            CircuitOpenError: Hvis breakeren er åben
+            Exception: Sidste fejl når retries eller deadline er opbrugt
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("AI tjenesten er midlertidigt utilgængelig")
+
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise TimeoutError("Deadline for AI kald overskredet")
+                response = self._attempt(kwargs, min(self.timeout, remaining))
+            except Exception as e:
+                if not is_retryable(e):
+                    # Udbyderen svarede (fx 400 eller 401) - ikke et nedbrud
+                    self.breaker.record_success()
+                    raise
+                if attempt >= self.max_retries:
+                    self.breaker.record_failure()
+                    raise
+                # Full jitter: spred retries så klienter ikke rammer samtidig
+                backoff = random.uniform(
+                    0, min(self.backoff_max, self.backoff_base * 2**attempt)
+                )
+                time.sleep(max(0, min(backoff, deadline - time.monotonic())))
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return response
+
+    def _create(self, kwargs, timeout):
+        return self.client.chat.completions.create(timeout=timeout, **kwargs)
+
+    def _attempt(self, kwargs, timeout):
+        if not self.hedge_delay or self.hedge_delay >= timeout:
+            return self._create(kwargs, timeout)
+
+        executor = _get_hedge_executor()
+        answered = threading.Event()
+        futures = {executor.submit(self._hedge, kwargs, timeout, answered)}
+        done, _ = wait(futures, timeout=self.hedge_delay)
+        if not done:
+            # Tail latency: send et duplikat og brug det første svar
+            hedge_timeout = max(timeout - self.hedge_delay, 0.001)
+            futures.add(executor.submit(self._hedge, kwargs, hedge_timeout, answered))
+
+        error = None
+        pending = futures
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    _abandon(pending)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _hedge(self, kwargs, timeout, answered):
+        # Et kald der først får en tråd efter at et andet har svaret, sendes ikke
+        if answered.is_set():
+            raise CancelledError()
+        response = self._create(kwargs, timeout)
+        answered.set()
+        return response
+
+
+def _abandon(futures):
+    """Annullerer tabende kald; kørende kald afsluttes af deres timeout."""
+    for future in futures:
+        if not future.cancel():
+            # Hent resultatet, så fejlen ikke bliver hængende uafhentet
+            future.add_done_callback(lambda f: f.exception())
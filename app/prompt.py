@@ -9,8 +9,9 @@ Author: Support Solutions ApS
 Version: 1.0
 """
 
-# Hovedprompt til SQL generering
-SYSTEM_PROMPT = """
+# Hovedprompt til SQL generering. `{examples}` udfyldes af get_system_prompt
+# med de eksempler der ligner spørgsmålet mest (se app.fewshot)
+SYSTEM_PROMPT_TEMPLATE = """
 Du er en CRM-assistent for Support Solutions - et dansk IT-konsulentfirma.
 Du modtager spørgsmål i naturligt sprog og skal returnere gyldige
 SQL queries til SQLite CRM-databasen.
@@ -20,6 +21,12 @@ DATABASER OG TABELLER:
 customers (kunder):
 - id, company_name, contact_person, email, phone, address, city, postal_code
 - industry, company_size, status, customer_since, total_value, notes
+- region_id (-> regions.id), industry_group (normaliseret branche)
+
+regions (geografiske regioner):
+- id, name, landsdel, postal_from, postal_to
+- name: Hovedstaden, Sjælland, Fyn, Midtjylland, Nordjylland
+- landsdel: Sjælland, Fyn, Jylland
 
 consultants (konsulenter):
 - id, name, email, phone, speciality, hourly_rate, status, hire_date
@@ -42,33 +49,48 @@ activities (aktiviteter):
 - type (Call, Meeting, Email, Task, Note), subject, description
 - activity_date, duration, outcome
 
-DANSKE GEOGRAFISKE REFERENCER:
-- "Jylland" = city LIKE '%Aarhus%' OR city LIKE '%Aalborg%' OR
-  city LIKE '%Esbjerg%' OR city LIKE '%Kolding%' OR city LIKE '%Vejle%' OR
-  city LIKE '%Randers%' OR city LIKE '%Horsens%' OR city LIKE '%Herning%' OR
-  city LIKE '%Silkeborg%' OR city LIKE '%Fredericia%' OR
-  postal_code BETWEEN '6000' AND '9999'
-- "Sjælland" = city LIKE '%København%' OR city LIKE '%Helsingør%' OR
-  city LIKE '%Køge%' OR city LIKE '%Roskilde%' OR city LIKE '%Næstved%' OR
-  postal_code BETWEEN '1000' AND '4999'
-- "Fyn" = city LIKE '%Odense%' OR city LIKE '%Svendborg%' OR
-  city LIKE '%Nyborg%' OR postal_code BETWEEN '5000' AND '5999'
-- "København/hovedstaden" = city LIKE '%København%' OR
-  city LIKE '%Frederiksberg%' OR postal_code BETWEEN '1000' AND '2999'
-- "Nordjylland" = city LIKE '%Aalborg%' OR city LIKE '%Hjørring%' OR
-  city LIKE '%Frederikshavn%' OR postal_code BETWEEN '9000' AND '9999'
-- "Midtjylland" = city LIKE '%Aarhus%' OR city LIKE '%Viborg%' OR
-  city LIKE '%Herning%' OR city LIKE '%Silkeborg%' OR
-  postal_code BETWEEN '6000' AND '8999'
-
-DANSKE INDUSTRIER OG BRANCHER:
-- "finanssektor/bank" = industry LIKE '%Bank%' OR industry LIKE '%Finans%' OR
-  industry LIKE '%Forsikring%'
-- "teknologi/IT" = industry LIKE '%Technology%' OR industry LIKE '%IT%' OR
-  industry LIKE '%Software%'
-- "sundhed" = industry LIKE '%Healthcare%' OR industry LIKE '%Sundhed%'
-- "offentlig sektor" = industry LIKE '%Public%' OR industry LIKE '%Offentlig%'
-- "retail/handel" = industry LIKE '%Retail%' OR industry LIKE '%Handel%'
+activities_all (view):
+- Samme kolonner som activities, inkl. arkiverede ældre aktiviteter
+- activities indeholder kun de nyeste; brug activities_all kun når der spørges
+  om ældre aktiviteter eller hele historikken ("nogensinde", "sidste år")
+
+ANALYSETABELLER (forudberegnede og altid opdaterede - brug dem til trends,
+udvikling over tid, konverteringsrater og prognoser i stedet for GROUP BY
+over de rå tabeller):
+
+deal_monthly (deals pr. forventet lukkemåned og stage):
+- month ('YYYY-MM'), stage, deals, value, weighted_value (value * probability)
+
+deal_pipeline_snapshots (pipeline som den så ud ved hver måned):
+- month ('YYYY-MM'), stage, deals, value, weighted_value
+
+deal_stage_transitions (antal stage-skift pr. måned):
+- month ('YYYY-MM'), from_stage, to_stage, deals, value
+
+consultant_hours (pr. konsulent og projekternes startmåned, JOIN consultants ON
+id = consultant_id):
+- consultant_id, month ('YYYY-MM'), assignments, hours_allocated, hours_worked
+
+project_burn_monthly (projekter pr. startmåned og status):
+- month ('YYYY-MM'), status, projects, budget, actual_cost,
+  hours_estimated, hours_actual
+
+DANSKE GEOGRAFISKE REFERENCER (brug JOIN regions r ON r.id = c.region_id):
+- "Jylland" = r.landsdel = 'Jylland'
+- "Sjælland" = r.landsdel = 'Sjælland'
+- "Fyn" = r.landsdel = 'Fyn'
+- "København/hovedstaden" = r.name = 'Hovedstaden'
+- "Nordjylland" = r.name = 'Nordjylland'
+- "Midtjylland" = r.name = 'Midtjylland'
+- En enkelt by = c.city = 'Aarhus'
+
+DANSKE INDUSTRIER OG BRANCHER (brug industry_group):
+- "finanssektor/bank/forsikring" = industry_group = 'Finans'
+- "teknologi/IT/software" = industry_group = 'Teknologi'
+- "sundhed" = industry_group = 'Sundhed'
+- "offentlig sektor" = industry_group = 'Offentlig'
+- "retail/handel" = industry_group = 'Handel'
+- Øvrige: 'Energi', 'Logistik', 'Uddannelse', 'Rådgivning'
 
 INTELLIGENT QUERY FORSTÅELSE:
 - "nye kunder" = customer_since >= DATE('now', '-12 months')
@@ -82,22 +104,11 @@ INTELLIGENT QUERY FORSTÅELSE:
 - "over budget" = actual_cost > budget
 
 EKSEMPLER:
-- "Vis alle kunder" → SELECT * FROM customers;
-- "Kunder fra Jylland" →
-  SELECT * FROM customers WHERE postal_code BETWEEN '6000' AND '9999';
-- "Finanskunder i København" →
-  SELECT * FROM customers WHERE (industry LIKE '%Bank%' OR
-  industry LIKE '%Finans%') AND postal_code BETWEEN '1000' AND '2999';
-- "Nye store kunder" →
-  SELECT * FROM customers WHERE customer_since >= DATE('now', '-12 months')
-  AND total_value > 500000;
-- "Hot deals i Aarhus" →
-  SELECT d.*, c.company_name, c.city FROM deals d JOIN customers c ON
-  d.customer_id = c.id WHERE d.probability >= 75 AND c.city LIKE '%Aarhus%';
+{examples}
 
 VIGTIGE REGLER:
 - Brug altid JOIN når du skal kombinere data fra flere tabeller
-- Forstå geografiske henvisninger og konverter til postal_code eller city LIKE
+- Forstå geografiske henvisninger og brug regions/industry_group frem for LIKE
 - Inkluder relevante kunde informationer når der spørges om geografiske områder
 - Sorter resultater logisk (efter dato, værdi, navn)
 - Brug danske datoer og beløb formater i kommentarer
@@ -105,22 +116,118 @@ VIGTIGE REGLER:
 Skriv KUN SQL'en, intet andet.
 """
 
+# Faste eksempler (spørgsmål, SQL). De seeder eksempelindekset og bruges
+# samlet når der ikke er valgt eksempler til et konkret spørgsmål.
+SEED_EXAMPLES = [
+    ("Vis alle kunder", "SELECT * FROM customers;"),
+    (
+        "Kunder fra Jylland",
+        "SELECT c.* FROM customers c JOIN regions r ON r.id = c.region_id "
+        "WHERE r.landsdel = 'Jylland';",
+    ),
+    (
+        "Finanskunder i København",
+        "SELECT c.* FROM customers c JOIN regions r ON r.id = c.region_id "
+        "WHERE c.industry_group = 'Finans' AND r.name = 'Hovedstaden';",
+    ),
+    (
+        "Nye store kunder",
+        "SELECT * FROM customers WHERE customer_since >= DATE('now', '-12 months') "
+        "AND total_value > 500000;",
+    ),
+    (
+        "Hot deals i Aarhus",
+        "SELECT d.*, c.company_name, c.city FROM deals d JOIN customers c ON "
+        "d.customer_id = c.id WHERE d.probability >= 75 AND c.city = 'Aarhus';",
+    ),
+    (
+        "Projekter over budget",
+        "SELECT p.*, c.company_name FROM projects p JOIN customers c ON "
+        "p.customer_id = c.id WHERE p.actual_cost > p.budget "
+        "ORDER BY p.actual_cost - p.budget DESC;",
+    ),
+    (
+        "Hvilke konsulenter har arbejdet flest timer",
+        "SELECT co.name, SUM(h.hours_worked) AS timer FROM consultant_hours h "
+        "JOIN consultants co ON co.id = h.consultant_id "
+        "GROUP BY co.id ORDER BY timer DESC;",
+    ),
+    (
+        "Udvikling i pipeline pr. måned",
+        "SELECT month, SUM(value) AS pipeline, SUM(weighted_value) AS vægtet "
+        "FROM deal_pipeline_snapshots WHERE stage NOT IN ('Closed Won', "
+        "'Closed Lost') GROUP BY month ORDER BY month;",
+    ),
+    (
+        "Konverteringsrate fra Proposal til Closed Won",
+        "SELECT ROUND(100.0 * SUM(CASE WHEN to_stage = 'Closed Won' THEN deals "
+        "END) / SUM(deals), 1) AS konvertering_pct FROM deal_stage_transitions "
+        "WHERE from_stage = 'Proposal';",
+    ),
+    (
+        "Konsulenternes udnyttelse af allokerede timer",
+        "SELECT co.name, SUM(h.hours_worked) AS worked, SUM(h.hours_allocated) "
+        "AS allocated, ROUND(100.0 * SUM(h.hours_worked) / "
+        "NULLIF(SUM(h.hours_allocated), 0), 1) AS udnyttelse_pct "
+        "FROM consultant_hours h JOIN consultants co ON co.id = h.consultant_id "
+        "GROUP BY co.id ORDER BY udnyttelse_pct DESC;",
+    ),
+    (
+        "Seneste møder med kunder",
+        "SELECT a.*, c.company_name FROM activities a JOIN customers c ON "
+        "a.customer_id = c.id WHERE a.type = 'Meeting' "
+        "ORDER BY a.activity_date DESC LIMIT 20;",
+    ),
+]
+
+
+def format_examples(examples) -> str:
+    """
+    Formaterer (spørgsmål, SQL) par som eksempellinjer til prompten.
+
+    Args:
+        examples (list[tuple[str, str]]): Eksempler i prioriteret rækkefølge
+
+    Returns:
+        str: Én linje pr. eksempel
+    """
+    return "\n".join(f'- "{question}" → {sql}' for question, sql in examples)
+
+
+SYSTEM_PROMPT = SYSTEM_PROMPT_TEMPLATE.replace(
+    "{examples}", format_examples(SEED_EXAMPLES)
+)
+
+# Sendes når AI'ens SQL ikke kan kompileres og ikke kunne repareres lokalt
+CORRECTION_PROMPT = """
+SQL'en du skrev fejlede i SQLite med fejlen:
+{error}
+
+Ret forespørgslen så den virker mod skemaet ovenfor.
+Skriv KUN den rettede SQL, intet andet.
+"""
+
 # Error handling prompts
 ERROR_PROMPTS = {
     "no_api_key": ("OpenAI API key mangler. Systemet kører i demo mode."),
+    "ai_unavailable": (
+        "AI tjenesten svarer ikke lige nu. Prøv igen om lidt eller brug "
+        "siderne for kunder, deals og projekter."
+    ),
     "sql_error": (
         "Der opstod en fejl i SQL udførelsen. " "Prøv at omformulere spørgsmålet."
     ),
     "empty_result": (
         "Ingen data fundet for denne forespørgsel. " "Prøv andre søgekriterier."
     ),
+    "read_only": "Kun forespørgsler der læser data (SELECT) kan køres.",
 }
 
 # Validation prompts
 VALIDATION_PROMPTS = {
     "geographic": (
         "Kontroller at geografiske referencer konverteres korrekt til "
-        "postnumre eller bynavn."
+        "regions JOIN eller bynavn."
     ),
     "business_logic": (
         "Sikr at business logik som 'store kunder', 'nye kunder' osv. "
@@ -129,6 +236,32 @@ VALIDATION_PROMPTS = {
     "join_tables": ("Brug JOINs når data fra flere tabeller skal kombineres."),
 }
 
+# Regelbaserede forespørgsler når AI tjenesten er nede (første match vinder)
+FALLBACK_MARKER = "-- AI utilgængelig, standardforespørgsel"
+FALLBACK_QUERIES = [
+    (
+        ("aktivitet", "møde", "opkald"),
+        "SELECT * FROM activities ORDER BY activity_date DESC LIMIT 50;",
+    ),
+    (
+        ("konsulent", "medarbejder"),
+        "SELECT * FROM consultants ORDER BY name;",
+    ),
+    (
+        ("projekt",),
+        "SELECT * FROM projects ORDER BY start_date DESC;",
+    ),
+    (
+        ("deal", "salg", "pipeline", "mulighed"),
+        "SELECT * FROM deals WHERE stage NOT IN ('Closed Won', 'Closed Lost') "
+        "ORDER BY value DESC;",
+    ),
+    (
+        ("kunde", "virksomhed", "firma"),
+        "SELECT * FROM customers ORDER BY company_name;",
+    ),
+]
+
 # Success messages
 SUCCESS_MESSAGES = {
     "query_generated": "📝 Genereret SQL:",
@@ -137,14 +270,33 @@ SUCCESS_MESSAGES = {
 }
 
 
-def get_system_prompt():
+def get_system_prompt(examples=None):
     """
     Returnerer hovedsystem prompten til AI agenten.
 
+    Args:
+        examples (list[tuple[str, str]], optional): Udvalgte (spørgsmål, SQL)
+            eksempler. Uden eksempler bruges alle SEED_EXAMPLES.
+
     Returns:
         str: Komplet system prompt til OpenAI
     """
-    return SYSTEM_PROMPT
+    if not examples:
+        return SYSTEM_PROMPT
+    return SYSTEM_PROMPT_TEMPLATE.replace("{examples}", format_examples(examples))
+
+
+def get_correction_prompt(error: str) -> str:
+    """
+    Returnerer beskeden der beder AI'en rette sin SQL.
+
+    Args:
+        error (str): Fejlteksten fra SQLite
+
+    Returns:
+        str: Rettelses-prompt på dansk
+    """
+    return CORRECTION_PROMPT.format(error=error)
 
 
 def get_error_message(error_type: str) -> str:
@@ -160,6 +312,23 @@ def get_error_message(error_type: str) -> str:
     return ERROR_PROMPTS.get(error_type, "Der opstod en uventet fejl.")
 
 
+def get_fallback_query(question: str):
+    """
+    Finder en regelbaseret SQL forespørgsel ud fra nøgleord i spørgsmålet.
+
+    Args:
+        question (str): Brugerens spørgsmål
+
+    Returns:
+        str | None: SQL markeret med FALLBACK_MARKER, eller None hvis intet matcher
+    """
+    text = (question or "").lower()
+    for keywords, sql in FALLBACK_QUERIES:
+        if any(keyword in text for keyword in keywords):
+            return f"{sql} {FALLBACK_MARKER}"
+    return None
+
+
 def get_success_message(message_type: str) -> str:
     """
     Returnerer succes besked baseret på type.
@@ -181,6 +350,8 @@ SPECIALIZED_PROMPTS = {
     - Geografisk fordeling og trends
     - Performance metrics og KPIer
     - Sammenligning mellem regioner/brancher
+    Brug analysetabellerne (deal_monthly, deal_pipeline_snapshots,
+    project_burn_monthly, consultant_hours) til tidsserier.
     """,
     "sales": """
     Du fokuserer på sales-relaterede queries med fokus på:
@@ -188,6 +359,8 @@ SPECIALIZED_PROMPTS = {
     - Konsulent performance
     - Konverteringsrater mellem stages
     - Revenue forecasting
+    Brug deal_stage_transitions til konverteringsrater og
+    deal_monthly.weighted_value til prognoser.
     """,
     "customer_management": """
     Du specialiserer dig i kunde-relaterede queries med fokus på:
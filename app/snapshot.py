@@ -0,0 +1,256 @@
+"""
+Support Solutions CRM - Læse-snapshot i hukommelsen
+==================================================
+
+Med CRM_READ_SNAPSHOT=1 kopieres databasen med SQLites backup API til en delt
+in-memory database (`cache=shared`), og `app.db.run_query` læser derfra i
+stedet for fra filen. Dashboard, lister og AI'ens forespørgsler får dermed
+læsninger med hukommelseshastighed uden fil-I/O og låsekonflikter med
+skrivninger. Læseforbindelserne kører med `query_only`.
+
+Skrivninger via run_action markerer kopien som forældet med det samme, så en
+request altid ser sine egne skrivninger. Ændringer fra andre processer
+markerer den forældet så snart `data_version()` ser dem - fragment cachen og
+ETags kalder den før de læser, så de aldrig gemmer gamle rækker under en ny
+version. Ellers sammenlignes kopiens version med filen højst hvert
+`POLL_SECONDS` - et tjek på hver læsning ville koste mere end hukommelsen
+sparer. Så længe kopien er forældet, læses der fra filen, mens en
+baggrundstråd bygger en ny kopi. Når den er klar, skiftes der over, og den
+gamle kopi frigives når dens sidste læser er færdig. Under opdateringen
+ligger databasen altså to gange i hukommelsen.
+
+Hver opdatering er en fuld kopi: backup API'et kan ikke kopiere kun de
+ændrede sider, og en kopi ind i den kopi der læses fra ville låse læserne
+ude. Derfor går der mindst SNAPSHOT_MIN_INTERVAL sekunder mellem to
+kopieringer, så en skrivetung belastning læser fra filen i stedet for at
+kopiere hele databasen efter hver skrivning. Snapshottet for standard
+databasen indlæses når web applikationen starter.
+"""
+
+import itertools
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from app.archive import attach_archive
+from app.config import settings
+from app.db import (
+    add_write_listener,
+    current_db_path,
+    data_version,
+    get_pool,
+    remove_write_listener,
+)
+
+# Ventetid efter en skrivning før kopien bygges, så en serie skrivninger
+# giver én opdatering
+REFRESH_DEBOUNCE_SECONDS = 0.25
+
+# Maks alder af tjekket mod data_version (ændringer fra andre processer)
+POLL_SECONDS = 1.0
+
+# Snapshots pr. databasefil
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+_names = itertools.count(1)
+
+
+class _Copy:
+    """Én in-memory kopi af databasen og dens ledige læseforbindelser."""
+
+    def __init__(self, path, version):
+        self.path = path
+        self.version = version
+        self.uri = f"file:crm-snapshot-{next(_names)}?mode=memory&cache=shared"
+        self._idle = queue.LifoQueue(maxsize=settings.db_pool_size)
+        self._lock = threading.Lock()
+        self._retired = False
+        # Holder den delte database i live, også når ingen læser fra den
+        self._keeper = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+
+    def load(self, source):
+        """Kopierer `source` (main) ind i hukommelsen med backup API'et."""
+        source.backup(self._keeper, pages=settings.snapshot_backup_pages)
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.uri,
+            uri=True,
+            check_same_thread=False,
+            cached_statements=settings.sqlite_statement_cache,
+        )
+        # Arkivet læses fra sin fil; viewet oprettes før query_only slås til
+        attach_archive(conn, self.path)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                keep = not self._retired
+                if keep:
+                    try:
+                        self._idle.put_nowait(conn)
+                    except queue.Full:
+                        keep = False
+            if not keep:
+                conn.close()
+
+    def retire(self):
+        """Lukker kopien; forbindelser der er lånt ud lukkes når de afleveres."""
+        with self._lock:
+            self._retired = True
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+        self._keeper.close()
+
+
+class ReadSnapshot:
+    """
+    Delt in-memory kopi af én databasefil, opdateret efter skrivninger.
+
+    Args:
+        path: Databasefilen der kopieres
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._copy = None
+        self._stale = False
+        self._checked_at = 0.0
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._changed = threading.Event()
+        self._thread = None
+        self._closed = False
+        add_write_listener(self.notify)
+
+    @property
+    def version(self):
+        """Databaseversionen den aktuelle kopi svarer til (None før første)."""
+        copy = self._copy
+        return copy.version if copy else None
+
+    def refresh(self):
+        """Bygger en ny kopi fra filen og skifter over til den."""
+        with self._refresh_lock:
+            # Flag og version læses før kopieringen: en skrivning undervejs
+            # markerer kopien forældet igen, den ser aldrig for ny ud. Det
+            # første kald opfanger en ekstern ændring (som ellers ville
+            # markere den nye kopi forældet med det samme)
+            data_version(self.path)
+            self._stale = False
+            version = data_version(self.path)
+            if version == self.version:
+                self._checked_at = time.monotonic()
+                return
+            copy = _Copy(self.path, version)
+            with get_pool(self.path).connection() as source:
+                copy.load(source)
+            with self._lock:
+                old, self._copy = self._copy, copy
+                self._checked_at = self._loaded_at = time.monotonic()
+            if old is not None:
+                old.retire()
+
+    def notify(self, path=None):
+        """Markér at data er ændret; kopien bygges i baggrunden."""
+        if path is not None and path != str(self.path):
+            return
+        self._stale = True
+        self._changed.set()
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="read-snapshot", daemon=True
+                )
+                self._thread.start()
+
+    def close(self):
+        """Frigiver kopien og stopper baggrundstråden."""
+        self._closed = True
+        remove_write_listener(self.notify)
+        self._changed.set()
+        with self._refresh_lock, self._lock:
+            old, self._copy = self._copy, None
+        if old is not None:
+            old.retire()
+
+    def _run(self):
+        while True:
+            self._changed.wait()
+            time.sleep(REFRESH_DEBOUNCE_SECONDS)
+            # Højst én fuld kopiering pr. snapshot_min_interval
+            wait = self._loaded_at + settings.snapshot_min_interval
+            time.sleep(max(0.0, wait - time.monotonic()))
+            self._changed.clear()
+            if self._closed:
+                return
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"⚠️ Opdatering af læse-snapshot fejlede: {e}")
+
+    def _is_current(self, copy):
+        if copy is None or self._stale:
+            return False
+        now = time.monotonic()
+        if now - self._checked_at < POLL_SECONDS:
+            return True
+        self._checked_at = now
+        return copy.version == data_version(self.path)
+
+    @contextmanager
+    def connection(self):
+        """Lån en læseforbindelse: fra kopien hvis den er aktuel, ellers filen."""
+        copy = self._copy
+        if not self._is_current(copy):
+            self.notify()
+            with get_pool(self.path).connection() as conn:
+                yield conn
+            return
+        with copy.connection() as conn:
+            yield conn
+
+
+def get_snapshot(path=None) -> ReadSnapshot:
+    """
+    Returnerer læse-snapshottet for `path` (standard: den aktuelle database).
+
+    Første kald indlæser databasen i hukommelsen (for standarddatabasen når
+    web applikationen starter), så de følgende læsninger rammer kopien med
+    det samme.
+    """
+    path = path or current_db_path()
+    key = str(path)
+    with _snapshots_lock:
+        snapshot = _snapshots.get(key)
+        if snapshot is None:
+            snapshot = _snapshots[key] = ReadSnapshot(path)
+    if snapshot.version is None:
+        snapshot.refresh()
+    return snapshot
+
+
+def discard_snapshot(path):
+    """Lukker og glemmer snapshottet for `path`, hvis der er et."""
+    with _snapshots_lock:
+        snapshot = _snapshots.pop(str(path), None)
+    if snapshot is not None:
+        snapshot.close()
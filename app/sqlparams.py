@@ -0,0 +1,165 @@
+"""
+Support Solutions CRM - Auto-parametrisering af genereret SQL
+============================================================
+
+AI'en skriver literaler direkte i SQL'en (`city = 'Aarhus'`,
+`total_value > 500000`), så hver variation er et nyt statement som SQLite
+skal parse og planlægge forfra. Her løftes literalerne ud som bundne
+parametre, så varianter deler én stabil skabelon der kan genbruges fra
+forbindelsens statement cache og bruges som fingerprint.
+"""
+
+import hashlib
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+ParameterizedQuery = namedtuple("ParameterizedQuery", "template params fingerprint")
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<space>\s+)
+  | (?P<comment>--[^\n]*|/\*.*?(?:\*/|$))
+  | (?P<blob>[xX]'[0-9A-Fa-f]*')
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<quoted>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])
+  | (?P<param>\?\d*|[:@$][A-Za-z_]\w*)
+  | (?P<number>0[xX][0-9A-Fa-f]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<word>[A-Za-z_][\w$]*)
+  | (?P<op>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# Nøgleord der afslutter en ORDER BY / GROUP BY liste
+_CLAUSE_END = {"LIMIT", "HAVING", "WINDOW", "UNION", "EXCEPT", "INTERSECT"}
+
+# Største heltal SQLite kan binde som INTEGER
+_MAX_INT = 2**63 - 1
+
+
+def tokens(sql: str):
+    """Deler SQL op i (art, tekst) tokens; bruges også af app.sqlrepair."""
+    for match in _TOKEN_RE.finditer(sql):
+        yield match.lastgroup, match.group()
+
+
+def _literal_value(kind: str, text: str):
+    if kind == "string":
+        return text[1:-1].replace("''", "'")
+    if any(c in text for c in ".eE"):
+        return float(text)
+    value = int(text)
+    if value > _MAX_INT:
+        raise ValueError(text)
+    return value
+
+
+def fingerprint(template: str) -> str:
+    """Kort, stabil hash af en SQL skabelon."""
+    return hashlib.sha1(template.encode("utf-8")).hexdigest()[:16]
+
+
+class _ClauseTracker:
+    """
+    Følger hvor i forespørgslen tokenizeren er: parentesdybde, SELECT-listen
+    og ORDER BY / GROUP BY lister, hvor literaler ikke må løftes ud.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.select_depth = None  # dybde for den SELECT-liste vi er inde i
+        self.by_depth = None  # dybde for en igangværende ORDER BY / GROUP BY
+        self.previous = ""
+
+    def _close_paren(self):
+        self.depth -= 1
+        if self.select_depth is not None and self.depth < self.select_depth:
+            self.select_depth = None
+        if self.by_depth is not None and self.depth < self.by_depth:
+            self.by_depth = None
+
+    def _word(self, upper):
+        if upper == "SELECT" and self.select_depth is None:
+            self.select_depth = self.depth
+        elif upper == "FROM" and self.select_depth == self.depth:
+            self.select_depth = None
+        elif upper == "BY" and self.previous in ("ORDER", "GROUP"):
+            self.by_depth = self.depth
+        elif upper in _CLAUSE_END and self.by_depth == self.depth:
+            self.by_depth = None
+
+    def liftable(self, kind, text) -> bool:
+        """Opdaterer tilstanden med ét token; True hvis en literal må løftes."""
+        upper = text.upper() if kind == "word" else text
+        if kind == "op" and text == "(":
+            self.depth += 1
+        elif kind == "op" and text == ")":
+            self._close_paren()
+        elif kind == "word":
+            self._word(upper)
+        positional = self.by_depth == self.depth and self.previous in ("BY", ",")
+        self.previous = upper
+        return self.select_depth is None and not positional
+
+
+def _lift(kind, text, params):
+    """Erstatter en streng- eller talliteral med `?` og gemmer værdien."""
+    if kind not in ("string", "number") or text.lower().startswith("0x"):
+        return text
+    try:
+        params.append(_literal_value(kind, text))
+    except ValueError:
+        return text
+    return "?"
+
+
+def unparameterized(sql: str) -> ParameterizedQuery:
+    """SQL'en som den er (uden parametre), med samme fingerprint-format."""
+    template = " ".join(sql.split())
+    return ParameterizedQuery(template, (), fingerprint(template))
+
+
+@lru_cache(maxsize=1024)
+def parameterize(sql: str) -> ParameterizedQuery:
+    """
+    Løfter streng- og talliteraler i en SELECT ud som `?` parametre.
+
+    Kommentarer fjernes og whitespace normaliseres, så varianter af samme
+    forespørgsel giver samme skabelon. Literaler i SELECT-listen (de bestemmer
+    kolonnenavnene) og positionelle referencer i ORDER BY / GROUP BY bevares.
+    Statements der ikke er SELECT/WITH, eller som allerede har parametre,
+    returneres uændret med tomme parametre.
+
+    Args:
+        sql (str): SQL genereret af AI'en
+
+    Returns:
+        ParameterizedQuery: (template, params, fingerprint)
+    """
+    # Kommentarer behandles som whitespace
+    scanned = [
+        ("space", " ") if kind == "comment" else (kind, text)
+        for kind, text in tokens(sql)
+    ]
+    words = [text.upper() for kind, text in scanned if kind == "word"]
+    if (
+        not words
+        or words[0] not in ("SELECT", "WITH")
+        or any(kind == "param" for kind, _ in scanned)
+    ):
+        return unparameterized(sql)
+
+    parts, params = [], []
+    clauses = _ClauseTracker()
+    for kind, text in scanned:
+        if kind == "space":
+            if parts and parts[-1] != " ":
+                parts.append(" ")
+            continue
+        if clauses.liftable(kind, text):
+            text = _lift(kind, text, params)
+        parts.append(text)
+
+    template = "".join(parts).strip()
+    return ParameterizedQuery(template, tuple(params), fingerprint(template))
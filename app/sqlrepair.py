@@ -0,0 +1,329 @@
+"""
+Support Solutions CRM - Validering og reparation af genereret SQL
+=================================================================
+
+Før AI'ens SQL køres, kompileres den med `EXPLAIN` mod det aktuelle skema
+uden at blive udført. Typiske fejl repareres lokalt: forklarende tekst før
+eller efter forespørgslen, flere statements, stavefejl i tabel- og
+kolonnenavne og danske/engelske tabelnavne ("kunder", "customer"). Kun
+fejl der ikke kan repareres her, kræver et nyt AI kald.
+"""
+
+import difflib
+import re
+import sqlite3
+import threading
+from collections import namedtuple
+
+from app.db import get_pool
+from app.sqlparams import tokens
+
+# Resultat af reparationen: endelig SQL, resterende fejl (None hvis den
+# kompilerer) og en liste med beskrivelser af de rettelser der er lavet
+Repair = namedtuple("Repair", "sql error fixes")
+
+# Danske og engelske navne AI'en ofte bruger i stedet for de rigtige tabeller
+TABLE_ALIASES = {
+    "kunder": "customers",
+    "kunde": "customers",
+    "customer": "customers",
+    "clients": "customers",
+    "konsulenter": "consultants",
+    "konsulent": "consultants",
+    "consultant": "consultants",
+    "medarbejdere": "consultants",
+    "employees": "consultants",
+    "salg": "deals",
+    "muligheder": "deals",
+    "deal": "deals",
+    "opportunities": "deals",
+    "projekter": "projects",
+    "projekt": "projects",
+    "project": "projects",
+    "aktiviteter": "activities",
+    "aktivitet": "activities",
+    "activity": "activities",
+    "regioner": "regions",
+    "region": "regions",
+}
+
+# Danske kolonnenavne -> kolonner i skemaet
+COLUMN_ALIASES = {
+    "by": "city",
+    "postnummer": "postal_code",
+    "branche": "industry",
+    "firmanavn": "company_name",
+    "kontaktperson": "contact_person",
+    "telefon": "phone",
+    "værdi": "value",
+    "sandsynlighed": "probability",
+    "budget_forbrug": "actual_cost",
+}
+
+# Laveste lighed (difflib ratio) for at en stavefejl rettes automatisk
+MATCH_CUTOFF = 0.75
+
+# Maks antal lokale rettelser før vi giver op
+MAX_FIXES = 5
+
+READ_ONLY_ERROR = "only SELECT statements are allowed"
+
+_MISSING_RE = re.compile(r"no such (table|column): (?:(\w+)\.)?(\w+)$")
+_START_RE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE | re.MULTILINE)
+
+_BY_KEYWORDS = {"ORDER", "GROUP", "PARTITION"}
+
+# Versal-nøgleord der afslører at en linje er SQL og ikke forklarende tekst
+_SQL_KEYWORDS = set(
+    "SELECT FROM WHERE AND OR NOT IN IS NULL LIKE BETWEEN JOIN LEFT INNER OUTER "
+    "ON AS GROUP ORDER BY HAVING LIMIT OFFSET UNION EXCEPT INTERSECT DESC ASC "
+    "CASE WHEN THEN ELSE END DISTINCT EXISTS WITH COUNT SUM AVG MIN MAX ROUND".split()
+)
+_PROSE_PUNCTUATION = {",", ".", ":", "!", "?", "-", "'"}
+_QUALIFIED_RE = re.compile(r"\b[A-Za-z_]\w*\.[A-Za-z_]")
+
+# Nøgleord der afgør hvad et statement gør (efter en evt. WITH-liste)
+_STATEMENT_KEYWORDS = {"SELECT", "VALUES", "INSERT", "UPDATE", "DELETE", "REPLACE"}
+
+# Skema pr. (databasefil, schema_version)
+_schemas = {}
+_schemas_lock = threading.Lock()
+
+
+def strip_fences(text: str) -> str:
+    """Fjerner markdown kodeblokke (```sql ... ```) omkring svaret."""
+    sql = (text or "").strip()
+    if sql.startswith("```"):
+        sql = re.sub(r"^```\w*", "", sql).replace("```", "").strip()
+    return sql
+
+
+def extract_sql(text: str) -> str:
+    """
+    Trækker selve forespørgslen ud af AI'ens svar.
+
+    Fjerner markdown fences og tekst før første SELECT/WITH, og beholder kun
+    det første statement.
+    """
+    sql = strip_fences(text)
+    start = _START_RE.search(sql)
+    if start:
+        offset = start.start()
+        sql = sql[offset:].strip()
+
+    # Klip ved første semikolon uden for strenge og kommentarer
+    length = 0
+    for kind, token in tokens(sql):
+        length += len(token)
+        if kind == "op" and token == ";":
+            return sql[:length]
+    return sql
+
+
+def is_read_only(sql: str) -> bool:
+    """
+    True hvis `sql` kun læser: SELECT, VALUES eller WITH ... SELECT.
+
+    Forbindelserne i app.db puljen genbruges, så PRAGMA, ATTACH/DETACH,
+    temp-objekter og skrivninger fra AI'en ville følge forbindelsen til de
+    næste requests. Alt andet end en ren læsning afvises derfor før kørsel.
+    """
+    depth = 0
+    first = True
+    for kind, text in tokens(sql):
+        if kind == "op":
+            depth += {"(": 1, ")": -1}.get(text, 0)
+            continue
+        if kind != "word" or depth:
+            continue
+        upper = text.upper()
+        if first and upper not in ("SELECT", "VALUES", "WITH"):
+            return False
+        first = False
+        if upper in _STATEMENT_KEYWORDS:
+            return upper in ("SELECT", "VALUES")
+    return False
+
+
+def _schema(conn, path=None):
+    """Tabeller/views -> kolonner; caches pr. databasefil og skemaversion."""
+    key = None
+    if path is not None:
+        version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        key = (str(path), version)
+    with _schemas_lock:
+        schema = _schemas.get(key)
+    if schema is None:
+        tables = [
+            name
+            for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type IN ('table', 'view') "
+                "AND name NOT LIKE 'sqlite_%' "
+                "UNION ALL SELECT name FROM sqlite_temp_master WHERE type = 'view'"
+            )
+        ]
+        schema = {
+            table: [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+            for table in tables
+        }
+        if key is not None:
+            with _schemas_lock:
+                _schemas[key] = schema
+    return schema
+
+
+def forget_schema(path):
+    """Glemmer de cachede skemaer for én databasefil."""
+    with _schemas_lock:
+        for key in [k for k in _schemas if k and k[0] == str(path)]:
+            del _schemas[key]
+
+
+def compile_error(conn, sql: str):
+    """Kompilerer `sql` med EXPLAIN og returnerer fejlteksten, eller None."""
+    try:
+        conn.execute(f"EXPLAIN {sql}")
+    except (sqlite3.Error, sqlite3.Warning) as e:
+        return str(e)
+    return None
+
+
+def _best_match(name, candidates, aliases):
+    lowered = name.lower()
+    alias = aliases.get(lowered)
+    if alias in candidates:
+        return alias
+    by_lower = {c.lower(): c for c in candidates}
+    if lowered in by_lower:
+        return by_lower[lowered]
+    matches = difflib.get_close_matches(lowered, by_lower, n=1, cutoff=MATCH_CUTOFF)
+    return by_lower[matches[0]] if matches else None
+
+
+def _replace_identifier(sql, name, replacement, qualifier=None):
+    """Erstatter identifikatoren `name` (evt. `qualifier.name`) i sql."""
+    parts = list(tokens(sql))
+    significant = [i for i, (kind, _) in enumerate(parts) if kind != "space"]
+    changed = False
+    for position, i in enumerate(significant):
+        kind, text = parts[i]
+        if kind != "word" or text.lower() != name.lower():
+            continue
+        first = max(0, position - 2)
+        before = [parts[j][1] for j in significant[first:position]]
+        if before and before[-1].upper() in _BY_KEYWORDS:
+            # "by" i ORDER BY / GROUP BY er et nøgleord, ikke kolonnen "by"
+            continue
+        qualified = len(before) == 2 and before[1] == "."
+        if qualifier is None and qualified:
+            continue
+        if qualifier is not None and (
+            not qualified or before[0].lower() != qualifier.lower()
+        ):
+            continue
+        parts[i] = (kind, replacement)
+        changed = True
+    return "".join(text for _, text in parts) if changed else None
+
+
+def _fix_missing(sql, error, schema):
+    match = _MISSING_RE.search(error)
+    if not match:
+        return None
+    what, qualifier, name = match.groups()
+
+    if what == "table":
+        table = _best_match(name, list(schema), TABLE_ALIASES)
+        fixed = table and _replace_identifier(sql, name, table, qualifier)
+        return fixed and (fixed, f"tabel {name} -> {table}")
+
+    # Foretræk kolonner fra tabeller der nævnes i forespørgslen
+    words = {text.lower() for kind, text in tokens(sql) if kind == "word"}
+    used = [t for t in schema if t.lower() in words] or list(schema)
+    columns = list(dict.fromkeys(c for t in used for c in schema[t]))
+    column = _best_match(name, columns, COLUMN_ALIASES)
+    fixed = column and _replace_identifier(sql, name, column, qualifier)
+    return fixed and (fixed, f"kolonne {name} -> {column}")
+
+
+def _is_syntax_error(error):
+    return "syntax error" in error or "incomplete input" in error
+
+
+def _is_prose(text):
+    """
+    True hvis `text` ligner forklarende tekst og ikke SQL.
+
+    SQL nøgleord skrevet med versaler, operatorer, strenge og identifikatorer
+    med `_` eller `alias.kolonne` tæller som SQL.
+    """
+    if _QUALIFIED_RE.search(text):
+        return False
+    for kind, token in tokens(text):
+        if kind in ("string", "quoted", "param", "blob"):
+            return False
+        if kind == "op" and token not in _PROSE_PUNCTUATION:
+            return False
+        if kind == "word" and (token in _SQL_KEYWORDS or "_" in token):
+            return False
+    return True
+
+
+def _strip_trailing_prose(conn, sql):
+    # Længste præfiks af hele linjer der kan parses (navnefejl rettes bagefter).
+    # Resten fjernes kun hvis det er prosa, eller forespørgslen sluttede med
+    # `;` - ellers er det en rigtig syntaksfejl, som AI'en skal rette
+    lines = sql.splitlines()
+    for end in range(len(lines) - 1, 0, -1):
+        candidate = "\n".join(lines[:end]).strip()
+        error = candidate and compile_error(conn, candidate)
+        if candidate and not (error and _is_syntax_error(error)):
+            tail = "\n".join(lines[end:])
+            if candidate.endswith(";") or _is_prose(tail):
+                return candidate
+            return None
+    return None
+
+
+def repair(text: str, conn=None) -> Repair:
+    """
+    Renser og validerer AI'ens SQL og retter kendte fejl lokalt.
+
+    Args:
+        text (str): AI'ens svar (kan indeholde markdown og forklaringer)
+        conn (sqlite3.Connection, optional): Forbindelse at kompilere mod.
+            Standard er en forbindelse fra app.db puljen.
+
+    Returns:
+        Repair: (sql, error, fixes) hvor error er None hvis SQL'en kompilerer
+    """
+    if conn is None:
+        pool = get_pool()
+        with pool.connection() as pooled:
+            return _repair(text, pooled, pool.path)
+    return _repair(text, conn, None)
+
+
+def _repair(text, conn, path):
+    sql = extract_sql(text)
+    fixes = []
+    if sql != strip_fences(text):
+        fixes.append("fjernede tekst uden for forespørgslen")
+    if not is_read_only(sql):
+        # Kompileres ikke engang: flere PRAGMAs virker allerede under EXPLAIN
+        return Repair(sql, READ_ONLY_ERROR, fixes)
+
+    error = compile_error(conn, sql)
+    while error and len(fixes) < MAX_FIXES:
+        if _is_syntax_error(error):
+            fixed = _strip_trailing_prose(conn, sql)
+            result = fixed and (fixed, "fjernede tekst efter forespørgslen")
+        else:
+            result = _fix_missing(sql, error, _schema(conn, path))
+        if not result:
+            break
+        sql, description = result
+        fixes.append(description)
+        error = compile_error(conn, sql)
+
+    return Repair(sql, error, fixes)
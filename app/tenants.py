@@ -0,0 +1,331 @@
+"""
+Support Solutions CRM - Tenants
+==============================
+
+Én installation kan betjene mange kundevirksomheder. Med CRM_TENANTS_DIR sat
+vælger hver request sin tenant med headeren `X-Tenant`, og alt i `app.db` -
+forbindelsespulje, databaseversion, fragment cache og læse-snapshot -
+arbejder derefter mod tenantens egen fil `<CRM_TENANTS_DIR>/<navn>.db`.
+Oversættelsescachen (spørgsmål -> SQL), few-shot eksemplerne og live
+dashboardet holdes også pr. tenant, så én kundes spørgsmål og data aldrig
+ender hos en anden.
+
+Hver tenant har højst TENANT_MAX_CONCURRENCY samtidige requests; flere venter
+op til TENANT_QUEUE_TIMEOUT sekunder og afvises derefter med 429, så én tung
+tenant ikke kan optage alle tråde. Højst TENANT_MAX_OPEN tenants holdes åbne;
+de længst ubrugte uden igangværende requests lukkes og åbnes igen ved næste
+request.
+
+Headeren bestemmer hvilke data requesten ser, så den skal sættes af en
+reverse proxy der har autentificeret brugeren. Proxyen skal fjerne
+`X-Tenant` og `X-Tenant-Auth` fra klientens request og selv sætte dem, med
+TENANT_PROXY_SECRET i `X-Tenant-Auth`. En header uden korrekt hemmelighed
+afvises med 403. Alternativt kan `init_app` få en anden resolver, fx en der
+finder tenanten ud fra login eller værtsnavn.
+
+Requests uden tenant afvises med 400, så de aldrig ser standarddatabasen ved
+en fejl (TENANT_ALLOW_DEFAULT=1 tillader dem). Nye tenants oprettes ved at
+lægge en databasefil i mappen - aldrig ud fra en header.
+"""
+
+import hmac
+import re
+import threading
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from flask import g, jsonify, request
+
+from app import fewshot, fragments
+from app.config import settings
+from app.db import close_database, use_database
+from app.snapshot import discard_snapshot
+from app.sqlrepair import forget_schema
+
+TENANT_HEADER = "X-Tenant"
+TENANT_AUTH_HEADER = "X-Tenant-Auth"
+
+# Endpoints uden tenantdata, som må bruges uden tenant
+PUBLIC_ENDPOINTS = {"static"}
+
+# Navnet bliver til et filnavn: ingen stier, punktummer eller arkivfiler
+_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+_current = ContextVar("crm_tenant", default=None)
+
+_router = None
+_router_lock = threading.Lock()
+
+
+class UnknownTenantError(LookupError):
+    """Tenanten har et ugyldigt navn eller ingen databasefil."""
+
+
+class TenantAuthError(PermissionError):
+    """Tenant headeren kommer ikke fra den betroede proxy."""
+
+
+class TenantBusyError(RuntimeError):
+    """Tenanten har nået sin grænse for samtidige requests."""
+
+
+class Tenant:
+    """
+    Én tenants databasefil, samtidighedsgrænse og egne objekter.
+
+    Args:
+        name (str): Tenantens navn
+        path (Path): Tenantens databasefil
+        max_concurrency (int): Maks samtidige requests
+    """
+
+    def __init__(self, name, path, max_concurrency):
+        self.name = name
+        self.path = path
+        self.active = 0
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self._resources = {}
+        self._lock = threading.Lock()
+
+    def resource(self, key, factory):
+        """Returnerer tenantens objekt for `key`; oprettes med `factory()`."""
+        with self._lock:
+            value = self._resources.get(key)
+            if value is None:
+                value = self._resources[key] = factory()
+            return value
+
+    def close(self):
+        """Lukker tenantens objekter, snapshot, caches og forbindelser."""
+        with self._lock:
+            resources, self._resources = self._resources, {}
+        for value in resources.values():
+            close = getattr(value, "close", None)
+            if close is not None:
+                close()
+        discard_snapshot(self.path)
+        fewshot.discard(self.path)
+        fragments.discard(self.path)
+        forget_schema(self.path)
+        close_database(self.path)
+
+
+class TenantRouter:
+    """
+    Finder tenants i en mappe og holder de senest brugte åbne.
+
+    Args:
+        root: Mappen med én databasefil pr. tenant
+        max_open (int, optional): Maks åbne tenants (settings.tenant_max_open)
+        max_concurrency (int, optional): Maks samtidige requests pr. tenant
+            (settings.tenant_max_concurrency)
+    """
+
+    def __init__(self, root, max_open=None, max_concurrency=None):
+        self.root = Path(root)
+        self._max_open = max_open
+        self._max_concurrency = max_concurrency
+        self._tenants = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tenants)
+
+    def path_for(self, name) -> Path:
+        """Databasefilen for `name`; UnknownTenantError hvis den ikke findes."""
+        if not _NAME_RE.match(name or "") or name.endswith("_archive"):
+            raise UnknownTenantError(f"Ugyldigt tenantnavn: {name!r}")
+        path = self.root / f"{name}.db"
+        if not path.is_file():
+            raise UnknownTenantError(f"Ukendt tenant: {name}")
+        return path
+
+    def _checkout(self, name) -> Tenant:
+        with self._lock:
+            tenant = self._tenants.get(name)
+            if tenant is None:
+                tenant = Tenant(
+                    name,
+                    self.path_for(name),
+                    self._max_concurrency or settings.tenant_max_concurrency,
+                )
+                self._tenants[name] = tenant
+            self._tenants.move_to_end(name)
+            tenant.active += 1
+            # Lukkes under låsen, så tenanten ikke åbnes igen midt i lukningen
+            self._evict_idle()
+        return tenant
+
+    def _checkin(self, tenant):
+        with self._lock:
+            tenant.active -= 1
+
+    def _evict_idle(self):
+        excess = len(self._tenants) - (self._max_open or settings.tenant_max_open)
+        for name, tenant in list(self._tenants.items()):
+            if excess <= 0:
+                break
+            if tenant.active == 0:
+                del self._tenants[name]
+                tenant.close()
+                excess -= 1
+
+    @contextmanager
+    def activate(self, name, limited=True, timeout=None):
+        """
+        Kør blokken som tenant `name`: `app.db` bruger tenantens databasefil.
+
+        Args:
+            name (str): Tenantens navn
+            limited (bool): Optag en af tenantens pladser til samtidige
+                requests (fra til lange streams, der ellers blokerer pladsen)
+            timeout (float, optional): Sekunder der ventes på en ledig plads.
+                Standard er settings.tenant_queue_timeout.
+
+        Raises:
+            UnknownTenantError: Tenanten findes ikke
+            TenantBusyError: Ingen ledig plads inden for timeout
+        """
+        tenant = self._checkout(name)
+        try:
+            if limited:
+                if timeout is None:
+                    timeout = settings.tenant_queue_timeout
+                if not tenant.slots.acquire(timeout=timeout):
+                    raise TenantBusyError(f"Tenant {name} har for mange requests")
+            try:
+                token = _current.set(tenant)
+                try:
+                    with use_database(tenant.path):
+                        yield tenant
+                finally:
+                    _current.reset(token)
+            finally:
+                if limited:
+                    tenant.slots.release()
+        finally:
+            self._checkin(tenant)
+
+    def close(self):
+        """Lukker alle åbne tenants."""
+        with self._lock:
+            tenants = list(self._tenants.values())
+            self._tenants.clear()
+            for tenant in tenants:
+                tenant.close()
+
+
+def current_tenant():
+    """Tenanten for den aktuelle request, eller None for standarddatabasen."""
+    return _current.get()
+
+
+def get_router() -> TenantRouter:
+    """Routeren for settings.tenants_dir (genopbygges hvis mappen skifter)."""
+    global _router
+    with _router_lock:
+        if _router is None or _router.root != Path(settings.tenants_dir):
+            if _router is not None:
+                _router.close()
+            _router = TenantRouter(settings.tenants_dir)
+        return _router
+
+
+def unlimited(view):
+    """Markér et view (fx en SSE stream) som undtaget fra tenantens pladser."""
+    view.tenant_unlimited = True
+    return view
+
+
+def trusted_tenant(req):
+    """
+    Standard resolver: tenantnavnet fra `X-Tenant`, hvis proxyen har sat det.
+
+    Headeren kan sættes af enhver klient, så den accepteres kun sammen med
+    `X-Tenant-Auth` lig TENANT_PROXY_SECRET. Uden hemmelighed stoles der
+    aldrig på headeren.
+
+    Returns:
+        str | None: Tenantnavnet, eller None hvis requesten ikke har header
+
+    Raises:
+        TenantAuthError: Headeren er sat, men ikke af den betroede proxy
+    """
+    name = req.headers.get(TENANT_HEADER)
+    if not name:
+        return None
+    secret = settings.tenant_proxy_secret or ""
+    supplied = req.headers.get(TENANT_AUTH_HEADER, "")
+    if not secret or not hmac.compare_digest(supplied.encode(), secret.encode()):
+        raise TenantAuthError(f"{TENANT_HEADER} er ikke sat af den betroede proxy")
+    return name
+
+
+def _error(status, message):
+    response = jsonify({"success": False, "error": message})
+    response.status_code = status
+    return response
+
+
+def _resolve(resolver):
+    """Tenantnavnet for requesten, eller et fejlsvar (navn, svar)."""
+    try:
+        name = resolver(request)
+    except TenantAuthError as e:
+        return None, _error(403, str(e))
+    if name or settings.tenant_allow_default or request.endpoint in PUBLIC_ENDPOINTS:
+        return name, None
+    # Fail closed: uden tenant ville requesten se standarddatabasen
+    return None, _error(400, "Tenant mangler")
+
+
+def _enter(name, limited):
+    """Aktiverer tenanten til teardown; returnerer et fejlsvar eller None."""
+    stack = ExitStack()
+    try:
+        stack.enter_context(get_router().activate(name, limited=limited))
+    except UnknownTenantError:
+        return _error(404, "Ukendt tenant")
+    except TenantBusyError as e:
+        response = _error(429, str(e))
+        response.headers["Retry-After"] = "1"
+        return response
+    g.tenant_scope = stack
+    return None
+
+
+def init_app(app, resolver=trusted_tenant):
+    """
+    Vælger tenant pr. request når CRM_TENANTS_DIR er sat.
+
+    Args:
+        app: Flask applikationen
+        resolver (callable, optional): `resolver(request)` -> tenantnavn eller
+            None; kaster TenantAuthError for ikke-betroede requests. Standard
+            er `trusted_tenant` (X-Tenant sat af proxyen med en fælles
+            hemmelighed).
+    """
+
+    @app.before_request
+    def _enter_tenant():
+        if not settings.tenants_dir:
+            return None
+        name, error = _resolve(resolver)
+        if not name:
+            return error
+        view = app.view_functions.get(request.endpoint)
+        return _enter(name, limited=not getattr(view, "tenant_unlimited", False))
+
+    @app.after_request
+    def _vary_on_tenant(response):
+        if settings.tenants_dir:
+            response.vary.add(TENANT_HEADER)
+        return response
+
+    @app.teardown_request
+    def _leave_tenant(exc):
+        stack = g.pop("tenant_scope", None)
+        if stack is not None:
+            stack.close()
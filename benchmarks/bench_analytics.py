@@ -0,0 +1,92 @@
+"""
+Benchmark: analysetabeller vs ad-hoc GROUP BY
+=============================================
+
+Fylder deals med syntetiske data og sammenligner et typisk trendspørgsmål
+(pipeline pr. måned og stage) mod de rå tabeller og mod `deal_monthly`, samt
+hvad triggerne koster pr. skrivning.
+
+Kør: python benchmarks/bench_analytics.py [antal deals]
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.analytics import ensure_analytics  # noqa: E402
+
+DEMO_SQL = os.path.join(os.path.dirname(__file__), "..", "app", "demo_data.sql")
+STAGES = ["Prospecting", "Qualified", "Proposal", "Negotiation", "Closed Won"]
+
+RAW = (
+    "SELECT strftime('%Y-%m', expected_close_date) AS month, stage, COUNT(*), "
+    "SUM(value), SUM(value * probability / 100.0) FROM deals "
+    "GROUP BY 1, 2 ORDER BY 1, 2"
+)
+ROLLUP = (
+    "SELECT month, stage, deals, value, weighted_value FROM deal_monthly "
+    "ORDER BY month, stage"
+)
+
+
+def deal_rows(rng, n):
+    for i in range(n):
+        yield (
+            rng.randint(1, 13),
+            f"Deal {i}",
+            rng.randint(10, 1000) * 1000,
+            rng.choice([10, 25, 50, 75, 90]),
+            rng.choice(STAGES),
+            f"20{rng.randint(20, 26)}-{rng.randint(1, 12):02d}-15",
+        )
+
+
+INSERT = (
+    "INSERT INTO deals (customer_id, title, value, probability, stage, "
+    "expected_close_date) VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+
+def timed(fn, rounds=1):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - started) / rounds * 1000
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "crm.db"))
+        with open(DEMO_SQL, encoding="utf-8") as f:
+            conn.executescript(f.read())
+        conn.executemany(INSERT, deal_rows(rng, n))
+        conn.commit()
+
+        plain_ms = timed(lambda: conn.executemany(INSERT, deal_rows(rng, 10_000)))
+        conn.rollback()
+
+        ensure_analytics(conn)
+        raw_ms = timed(lambda: conn.execute(RAW).fetchall(), 5)
+        rollup_ms = timed(lambda: conn.execute(ROLLUP).fetchall(), 200)
+        trigger_ms = timed(lambda: conn.executemany(INSERT, deal_rows(rng, 10_000)))
+        conn.rollback()
+        conn.close()
+
+    print(f"{n} deals")
+    print(f"pipeline pr. måned, rå GROUP BY:  {raw_ms:8.2f} ms")
+    print(f"pipeline pr. måned, deal_monthly: {rollup_ms:8.2f} ms")
+    print(
+        f"10k inserts: {plain_ms:.0f} ms uden triggers, "
+        f"{trigger_ms:.0f} ms med ({trigger_ms / 10_000 * 1000:.0f} µs/række)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark: varm/kold opdeling af aktiviteter
+============================================
+
+Bygger en database med mange års aktiviteter og måler dashboardets "seneste
+aktiviteter" og en fuld aktivitetsliste (som /activities) før og efter
+arkivering af alt ældre end horisonten.
+
+Kør: python benchmarks/bench_archive.py [antal aktiviteter] [horisont i dage]
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.archive import archive_activities, attach_archive  # noqa: E402
+from app.db import ensure_schema  # noqa: E402
+
+DEMO_SQL = os.path.join(os.path.dirname(__file__), "..", "app", "demo_data.sql")
+
+RECENT = (
+    "SELECT a.type, a.subject, a.activity_date, c.company_name FROM activities a "
+    "LEFT JOIN customers c ON a.customer_id = c.id "
+    "ORDER BY a.activity_date DESC LIMIT 5"
+)
+LISTING = (
+    "SELECT a.*, c.company_name FROM activities a "
+    "LEFT JOIN customers c ON a.customer_id = c.id ORDER BY a.activity_date DESC"
+)
+
+
+def build(path, n):
+    conn = sqlite3.connect(path)
+    with open(DEMO_SQL, encoding="utf-8") as f:
+        conn.executescript(f.read())
+    rng = random.Random(1)
+    conn.executemany(
+        "INSERT INTO activities (customer_id, consultant_id, type, subject, "
+        "description, activity_date, duration, outcome) "
+        "VALUES (?, ?, ?, ?, ?, datetime('now', ?), ?, ?)",
+        (
+            (
+                rng.randint(1, 13),
+                rng.randint(1, 5),
+                rng.choice(["Call", "Meeting", "Email", "Task", "Note"]),
+                f"Aktivitet {i}",
+                "Opfølgning på tilbud og næste skridt " * 3,
+                f"-{rng.randint(0, 5 * 365 * 24)} hours",
+                rng.randint(5, 120),
+                rng.choice(["Positive", "Neutral", "Follow-up needed"]),
+            )
+            for i in range(n)
+        ),
+    )
+    conn.commit()
+    ensure_schema(conn, path)
+    attach_archive(conn, path)
+    return conn
+
+
+def timed(conn, sql, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        rows = conn.execute(sql).fetchall()
+    return (time.perf_counter() - started) / rounds * 1000, len(rows)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    horizon = int(sys.argv[2]) if len(sys.argv) > 2 else 365
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = build(os.path.join(tmp, "crm.db"), n)
+        before = [timed(conn, RECENT, 200), timed(conn, LISTING, 3)]
+
+        started = time.perf_counter()
+        moved = archive_activities(conn, horizon_days=horizon)
+        job_s = time.perf_counter() - started
+
+        after = [timed(conn, RECENT, 200), timed(conn, LISTING, 3)]
+        conn.close()
+
+    print(f"{n} aktiviteter, {moved} arkiveret på {job_s:.1f} s (horisont {horizon})")
+    for label, (b_ms, b_rows), (a_ms, a_rows) in zip(
+        ["seneste 5", "fuld liste"], before, after
+    ):
+        print(
+            f"{label:11s} før {b_ms:8.2f} ms ({b_rows} rækker)"
+            f"   efter {a_ms:8.2f} ms ({a_rows} rækker)"
+        )
+
+
+if __name__ == "__main__":
+    main()
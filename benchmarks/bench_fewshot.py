@@ -0,0 +1,75 @@
+"""
+Benchmark: dynamiske few-shot eksempler
+=======================================
+
+Fylder eksempelindekset med syntetiske danske spørgsmål og måler opslagstid
+pr. spørgsmål samt promptens længde med udvalgte eksempler i forhold til den
+faste prompt med alle eksempler.
+
+Kør: python benchmarks/bench_fewshot.py [antal par]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.fewshot import ExampleIndex  # noqa: E402
+from app.prompt import SEED_EXAMPLES, get_system_prompt  # noqa: E402
+
+VERBS = ["Vis", "Find", "Hvilke", "List", "Tæl", "Hvor mange"]
+MODIFIERS = ["store", "nye", "aktive", "åbne", "vundne", "tabte", "forsinkede"]
+SUBJECTS = ["kunder", "deals", "projekter", "konsulenter", "aktiviteter", "møder"]
+PLACES = ["i Aarhus", "i Odense", "i København", "fra Jylland", "på Fyn"]
+PERIODS = ["i år", "denne måned", "sidste kvartal", "den seneste uge", ""]
+
+QUESTIONS = [
+    "Vis store finanskunder i Aarhus",
+    "Hvor mange åbne deals har vi i år?",
+    "Projekter over budget på Fyn",
+    "Hvilke konsulenter har flest timer denne måned",
+]
+
+
+def synthetic_question(rng):
+    parts = [rng.choice(group) for group in (VERBS, MODIFIERS, SUBJECTS)]
+    parts += [rng.choice(PLACES), rng.choice(PERIODS)]
+    return " ".join(p for p in parts if p)
+
+
+def main():
+    pairs = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+    rng = random.Random(1)
+    index = ExampleIndex(maxsize=pairs)
+    for question, sql in SEED_EXAMPLES:
+        index.add(question, sql, pinned=True)
+
+    started = time.perf_counter()
+    while len(index) < pairs:
+        index.add(synthetic_question(rng), "SELECT * FROM customers;")
+    add_us = (time.perf_counter() - started) / pairs * 1e6
+
+    rounds = 2000
+    started = time.perf_counter()
+    for i in range(rounds):
+        index.search(QUESTIONS[i % len(QUESTIONS)], k=4)
+    search_us = (time.perf_counter() - started) / rounds * 1e6
+
+    full = len(get_system_prompt())
+    print(f"{pairs} par i indekset")
+    print(f"tilføj:  {add_us:7.1f} µs/par")
+    print(f"opslag:  {search_us:7.1f} µs/spørgsmål (k=4)")
+    print(f"fast prompt: {full} tegn")
+    for question in QUESTIONS:
+        # Sammenlign med kun seed-eksemplerne, som i en frisk proces
+        seeded = ExampleIndex()
+        for q, sql in SEED_EXAMPLES:
+            seeded.add(q, sql)
+        examples = [(q, sql) for q, sql, _ in seeded.search(question, k=3)]
+        print(f"  {len(get_system_prompt(examples)):5d} tegn  {question!r}")
+
+
+if __name__ == "__main__":
+    main()
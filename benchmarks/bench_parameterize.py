@@ -0,0 +1,92 @@
+"""
+Benchmark: auto-parametrisering af genereret SQL
+================================================
+
+Sammenligner at køre mange literal-varianter af de samme forespørgsler som
+rå SQL (hver variant parses og planlægges forfra) med at køre den
+parametriserede skabelon (genbruges fra forbindelsens statement cache).
+
+Kør: python benchmarks/bench_parameterize.py
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.config import SQLITE_STATEMENT_CACHE  # noqa: E402
+from app.sqlparams import parameterize  # noqa: E402
+
+DEMO_SQL = os.path.join(os.path.dirname(__file__), "..", "app", "demo_data.sql")
+CITIES = ["Aarhus", "Odense", "København", "Aalborg", "Vejle", "Herning"]
+TEMPLATES = [
+    "SELECT * FROM customers WHERE city LIKE '%{city}%' AND total_value > {value}",
+    "SELECT d.*, c.company_name FROM deals d JOIN customers c "
+    "ON d.customer_id = c.id WHERE d.probability >= {prob} AND c.city = '{city}' "
+    "ORDER BY d.value DESC LIMIT {limit}",
+    "SELECT p.name, p.budget, p.actual_cost FROM projects p "
+    "WHERE p.actual_cost > p.budget * {ratio} AND p.status = 'In Progress'",
+]
+VARIANTS = 20000
+
+
+def make_queries(n):
+    rng = random.Random(42)
+    return [
+        rng.choice(TEMPLATES).format(
+            city=rng.choice(CITIES),
+            value=rng.randrange(0, 2_000_000, 1000),
+            prob=rng.randrange(0, 100),
+            limit=rng.randrange(1, 50),
+            ratio=round(rng.uniform(0.5, 1.5), 2),
+        )
+        for _ in range(n)
+    ]
+
+
+def connect():
+    conn = sqlite3.connect(":memory:", cached_statements=SQLITE_STATEMENT_CACHE)
+    with open(DEMO_SQL, encoding="utf-8") as f:
+        conn.executescript(f.read())
+    return conn
+
+
+def bench(label, conn, statements):
+    start = time.perf_counter()
+    for sql, params in statements:
+        conn.execute(sql, params).fetchall()
+    elapsed = time.perf_counter() - start
+    per_query = elapsed / len(statements) * 1e6
+    print(f"{label:<34} {elapsed * 1000:9.1f} ms  {per_query:7.1f} µs/query")
+    return elapsed
+
+
+def main():
+    queries = make_queries(VARIANTS)
+
+    start = time.perf_counter()
+    parameterized = [parameterize(sql) for sql in queries]
+    normalize = time.perf_counter() - start
+
+    templates = {q.template for q in parameterized}
+    print(f"{VARIANTS} varianter -> {len(templates)} skabeloner")
+    print(
+        f"{'parameterize() overhead':<34} {normalize * 1000:9.1f} ms  "
+        f"{normalize / VARIANTS * 1e6:7.1f} µs/query"
+    )
+
+    raw = bench("rå SQL (parse+plan hver gang)", connect(), [(q, ()) for q in queries])
+    bound = bench(
+        "skabelon + parametre (cache)",
+        connect(),
+        [(q.template, q.params) for q in parameterized],
+    )
+    saved = (raw - bound) / VARIANTS * 1e6
+    print(f"SQLite parse/plan sparet pr. query: {saved:.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark: server-rendering vs. cachet sideskal og JSON rækker
+==============================================================
+
+Bygger en database med mange aktiviteter og deals og måler server CPU og
+svarstørrelse pr. sidevisning af /activities og /deals:
+
+- server:  alle rækker renderes i Jinja på hver request (CRM_RENDER_MODE=server)
+- client:  cachet sideskal + rækkerne som JSON fra /api/<entity>/rows
+- gentaget: som client, men browseren har allerede rækkerne (ETag -> 304)
+- efter skrivning: første client visning efter en ændring (cache miss)
+
+Kør: python benchmarks/bench_render.py [antal rækker ...]
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app import fragments  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.db import run_action  # noqa: E402
+from web import app  # noqa: E402
+
+DEMO_SQL = os.path.join(os.path.dirname(__file__), "..", "app", "demo_data.sql")
+
+
+def build(path, n):
+    conn = sqlite3.connect(path)
+    with open(DEMO_SQL, encoding="utf-8") as f:
+        conn.executescript(f.read())
+    rng = random.Random(1)
+    conn.executemany(
+        "INSERT INTO activities (customer_id, consultant_id, type, subject, "
+        "description, activity_date, duration, outcome) "
+        "VALUES (?, ?, ?, ?, ?, datetime('now', ?), ?, ?)",
+        (
+            (
+                rng.randint(1, 13),
+                rng.randint(1, 5),
+                rng.choice(["Call", "Meeting", "Email", "Task", "Note"]),
+                f"Aktivitet {i}",
+                "Opfølgning på tilbud og næste skridt",
+                f"-{rng.randint(0, 300 * 24)} hours",
+                rng.randint(5, 120),
+                rng.choice(["Positive", "Neutral", "Follow-up needed"]),
+            )
+            for i in range(n)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO deals (customer_id, title, description, value, probability, "
+        "stage, expected_close_date, assigned_consultant_id) "
+        "VALUES (?, ?, ?, ?, ?, ?, date('now', ?), ?)",
+        (
+            (
+                rng.randint(1, 13),
+                f"Deal {i}",
+                "Implementering og support af nyt system",
+                rng.randint(10, 5000) * 1000,
+                rng.choice([10, 25, 50, 75, 90]),
+                rng.choice(["Prospecting", "Qualified", "Proposal", "Negotiation"]),
+                f"+{rng.randint(0, 365)} days",
+                rng.randint(1, 5),
+            )
+            for i in range(n)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def view(client, urls, etags=None):
+    """CPU sekunder og bytes for én sidevisning (sideskal + evt. rækker)."""
+    started = time.process_time()
+    size = 0
+    for url in urls:
+        headers = {"If-None-Match": etags[url]} if etags else {}
+        response = client.get(url, headers=headers)
+        size += len(response.data)
+    return time.process_time() - started, size
+
+
+def measure(client, entity, rounds):
+    page, rows = f"/{entity}", f"/api/{entity}/rows"
+
+    settings.render_mode = "server"
+    server = min(view(client, [page]) for _ in range(rounds))
+
+    settings.render_mode = "client"
+    run_action("UPDATE deals SET probability = probability WHERE id = 1")
+    after_write = view(client, [page, rows])
+    client_view = min(view(client, [page, rows]) for _ in range(rounds))
+    etags = {url: client.get(url).headers.get("ETag", "") for url in (page, rows)}
+    repeat = min(view(client, [page, rows], etags) for _ in range(rounds))
+    return server, client_view, repeat, after_write
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or [10_000, 100_000]
+    app.config["TESTING"] = True
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "crm.db")
+            build(path, n)
+            settings.db_path = path
+            fragments.clear()
+            rounds = 5 if n <= 10_000 else 2
+            print(f"\n{n} aktiviteter og {n} deals")
+            with app.test_client() as client:
+                for entity in ("activities", "deals"):
+                    results = measure(client, entity, rounds)
+                    for label, (cpu, size) in zip(
+                        ["server", "client", "gentaget", "efter skrivning"], results
+                    ):
+                        print(
+                            f"  /{entity:10s} {label:16s} {cpu * 1000:9.1f} ms CPU"
+                            f"  {size / 1024:9.0f} KB"
+                        )
+    settings.reload()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark: kompakt ResultSet vs liste af dicts
+==============================================
+
+Måler hukommelse og JSON serialisering for store resultater, hvor den gamle
+`run_query` lavede en dict pr. række (kolonnenavne gentaget pr. række) og
+API'erne sendte nøglerne pr. række.
+
+Kør: python benchmarks/bench_results.py [antal rækker ...]
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.db import ResultSet, json_default  # noqa: E402
+
+QUERY = (
+    "SELECT id, company_name, contact_person, email, city, postal_code, "
+    "industry, status, total_value FROM customers"
+)
+
+
+def make_db(n):
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        "CREATE TABLE customers (id INTEGER PRIMARY KEY, company_name TEXT, "
+        "contact_person TEXT, email TEXT, city TEXT, postal_code TEXT, "
+        "industry TEXT, status TEXT, total_value REAL)"
+    )
+    conn.executemany(
+        "INSERT INTO customers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            (
+                i,
+                f"Kunde {i} ApS",
+                f"Kontakt {i}",
+                f"kontakt{i}@kunde.dk",
+                "Aarhus",
+                "8000",
+                "Software",
+                "Active",
+                i * 1000.0,
+            )
+            for i in range(n)
+        ),
+    )
+    return conn
+
+
+def as_dicts(conn):
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(QUERY).fetchall()
+    conn.row_factory = None
+    return [dict(row) for row in rows]
+
+
+def as_resultset(conn):
+    return ResultSet.from_cursor(conn.execute(QUERY))
+
+
+def measure(label, build, encode, conn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build(conn)
+    built = time.perf_counter()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    payload = encode(result)
+    encoded = time.perf_counter()
+    print(
+        f"  {label:<12} fetch {1000 * (built - start):7.1f} ms  "
+        f"mem {memory / 2**20:7.1f} MiB  "
+        f"json {1000 * (encoded - built):7.1f} ms  {len(payload) / 2**20:6.1f} MiB"
+    )
+    del result
+
+
+def main(sizes):
+    for n in sizes:
+        print(f"{n} rækker:")
+        conn = make_db(n)
+        measure("list[dict]", as_dicts, json.dumps, conn)
+        measure(
+            "ResultSet",
+            as_resultset,
+            lambda r: json.dumps(r, default=json_default),
+            conn,
+        )
+
+
+if __name__ == "__main__":
+    main([int(n) for n in sys.argv[1:]] or [10_000, 100_000])
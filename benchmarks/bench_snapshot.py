@@ -0,0 +1,147 @@
+"""
+Benchmark: læsninger fra filen vs. læse-snapshot i hukommelsen
+==============================================================
+
+Bygger en database med mange deals og aktiviteter og måler opslag af enkelte
+deals, dashboardets forespørgsler og en fuld dealliste via `run_query` -
+først fra filen, så fra in-memory kopien - samt hvor lang tid det tager at
+bygge kopien. Målingerne gentages mens en anden tråd læser samtidig.
+
+Kør: python benchmarks/bench_snapshot.py [antal rækker]
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.config import settings  # noqa: E402
+from app.db import run_query  # noqa: E402
+from app.snapshot import get_snapshot  # noqa: E402
+
+DEMO_SQL = os.path.join(os.path.dirname(__file__), "..", "app", "demo_data.sql")
+
+DASHBOARD = [
+    "SELECT COUNT(*) as total, SUM(value) as total_value, "
+    "AVG(probability) as avg_probability FROM deals "
+    "WHERE stage NOT IN ('Closed Won', 'Closed Lost')",
+    "SELECT a.type, a.subject, a.activity_date, c.company_name FROM activities a "
+    "LEFT JOIN customers c ON a.customer_id = c.id "
+    "ORDER BY a.activity_date DESC LIMIT 5",
+    "SELECT d.title, d.value, d.stage, c.company_name FROM deals d "
+    "LEFT JOIN customers c ON d.customer_id = c.id "
+    "WHERE d.stage NOT IN ('Closed Won', 'Closed Lost') ORDER BY d.value DESC LIMIT 5",
+]
+LISTING = (
+    "SELECT d.*, c.company_name as customer_name FROM deals d "
+    "LEFT JOIN customers c ON d.customer_id = c.id ORDER BY d.value DESC"
+)
+
+
+def build(path, n):
+    conn = sqlite3.connect(path)
+    with open(DEMO_SQL, encoding="utf-8") as f:
+        conn.executescript(f.read())
+    rng = random.Random(1)
+    conn.executemany(
+        "INSERT INTO deals (customer_id, title, value, probability, stage) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (
+            (
+                rng.randint(1, 13),
+                f"Deal {i}",
+                rng.randint(10, 5000) * 1000,
+                rng.choice([10, 25, 50, 75, 90]),
+                rng.choice(["Prospecting", "Qualified", "Proposal", "Negotiation"]),
+            )
+            for i in range(n)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO activities (customer_id, type, subject, activity_date) "
+        "VALUES (?, ?, ?, datetime('now', ?))",
+        (
+            (rng.randint(1, 13), "Call", f"Aktivitet {i}", f"-{i % 8760} hours")
+            for i in range(n)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def timed(queries, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for sql in queries:
+            run_query(sql)
+    return (time.perf_counter() - started) / rounds * 1000
+
+
+def lookups(n, count=20_000):
+    started = time.perf_counter()
+    for i in range(count):
+        run_query("SELECT * FROM deals WHERE id = ?", (i % n + 1,))
+    return (time.perf_counter() - started) / count * 1e6
+
+
+def measure(rounds, n):
+    return lookups(n), timed(DASHBOARD, rounds * 10), timed([LISTING], rounds)
+
+
+def with_background_reader(rounds, n):
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            run_query(LISTING)
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    try:
+        return measure(rounds, n)
+    finally:
+        stop.set()
+        thread.join()
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "crm.db")
+        build(path, n)
+        settings.db_path = path
+        run_query("SELECT 1")  # Skema og pulje oprettes uden for målingen
+
+        settings.read_snapshot = False
+        file_alone = measure(5, n)
+        file_busy = with_background_reader(5, n)
+
+        settings.read_snapshot = True
+        started = time.perf_counter()
+        get_snapshot()
+        load_ms = (time.perf_counter() - started) * 1000
+        memory_alone = measure(5, n)
+        memory_busy = with_background_reader(5, n)
+
+    print(f"{n} deals og {n} aktiviteter, snapshot bygget på {load_ms:.0f} ms")
+    print(f"{'':22s}{'opslag':>12s}{'dashboard':>12s}{'dealliste':>12s}")
+    for label, (lookup_us, dashboard_ms, listing_ms) in [
+        ("fil", file_alone),
+        ("fil + samtidig læser", file_busy),
+        ("snapshot", memory_alone),
+        ("snapshot + samtidig", memory_busy),
+    ]:
+        print(
+            f"{label:22s}{lookup_us:9.1f} µs{dashboard_ms:9.2f} ms"
+            f"{listing_ms:9.1f} ms"
+        )
+    settings.reload()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark: opstartstid for web appen
+====================================
+
+Måler koldstart i friske processer: tiden for `import web`, tiden til første
+svar på en CRM side, og om `openai` bliver importeret undervejs. Bruges til
+at holde øje med opstartstiden ved container genstart og autoscaling.
+
+Kør: python benchmarks/bench_startup.py [antal kørsler]
+         python benchmarks/bench_startup.py --importtime   (dyreste imports)
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+IMPORT_SCRIPT = """
+import sys, time
+t0 = time.perf_counter()
+import web
+t1 = time.perf_counter()
+with web.app.test_client() as client:
+    assert client.get("/customers").status_code == 200
+t2 = time.perf_counter()
+print(t1 - t0, t2 - t0, int("openai" in sys.modules))
+"""
+
+
+def run_once():
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+    return float(output[-3]), float(output[-2]), output[-1] == "1"
+
+
+def import_profile(top=15):
+    """Kumulativ import-tid pr. top-level modul fra `python -X importtime`."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import web"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.partition(":")[2].split("|")
+        # Navnet er indrykket to mellemrum pr. niveau; vis web og dets imports
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if cumulative.strip().isdigit() and depth <= 1:
+            rows.append((int(cumulative), name.strip()))
+    for micros, name in sorted(rows, reverse=True)[:top]:
+        print(f"{micros / 1000:8.1f} ms  {name}")
+
+
+def main():
+    if "--importtime" in sys.argv:
+        import_profile()
+        return
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    results = [run_once() for _ in range(runs)]
+    imports = [r[0] * 1000 for r in results]
+    first = [r[1] * 1000 for r in results]
+
+    print(f"{runs} kolde starter")
+    print(
+        f"import web:          median {statistics.median(imports):7.1f} ms"
+        f"  (min {min(imports):.1f})"
+    )
+    print(
+        f"første svar:         median {statistics.median(first):7.1f} ms"
+        f"  (min {min(first):.1f})"
+    )
+    print(f"openai importeret:   {'ja' if results[0][2] else 'nej'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark: mange tenants i én proces
+====================================
+
+Lægger et antal tenant databaser i en midlertidig mappe og måler via
+Flask test klienten:
+
+- varm:     request til en tenant der allerede er åben
+- kold:     request der åbner en tenant og lukker den længst ubrugte
+            (flere tenants end TENANT_MAX_OPEN)
+- fairness: svartid for en let tenant mens en tung tenant holder flere
+            requests i gang end serveren har tråde, med og uden grænsen
+            for samtidige requests pr. tenant
+
+Kør: python benchmarks/bench_tenants.py [antal tenants]
+"""
+
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.config import settings  # noqa: E402
+from app.tenants import get_router  # noqa: E402
+from web import app  # noqa: E402
+
+DEMO_SQL = os.path.join(os.path.dirname(__file__), "..", "app", "demo_data.sql")
+
+# Servertråde (som waitress/gunicorn threads) og den tunge tenants samtidige
+# requests
+WORKERS = 8
+HEAVY_REQUESTS = 16
+
+PROXY_SECRET = "bench"
+
+
+def build(root, count):
+    template = os.path.join(root, "template.sqlite")
+    conn = sqlite3.connect(template)
+    with open(DEMO_SQL, encoding="utf-8") as f:
+        conn.executescript(f.read())
+    conn.close()
+    for i in range(count):
+        shutil.copyfile(template, os.path.join(root, f"t{i}.db"))
+    # Den tunge tenant har mange aktiviteter
+    conn = sqlite3.connect(os.path.join(root, "t0.db"))
+    conn.executemany(
+        "INSERT INTO activities (customer_id, type, subject, activity_date) "
+        "VALUES (?, 'Call', ?, datetime('now', ?))",
+        ((i % 13 + 1, f"Aktivitet {i}", f"-{i % 8760} hours") for i in range(200_000)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def latency(client, tenant, url="/api/crm/stats"):
+    started = time.perf_counter()
+    headers = {"X-Tenant": tenant, "X-Tenant-Auth": PROXY_SECRET}
+    response = client.get(url, headers=headers)
+    assert response.status_code in (200, 429), response.status_code
+    return (time.perf_counter() - started) * 1000, response.status_code
+
+
+def warm_and_cold(count):
+    with app.test_client() as client:
+        latency(client, "t1")
+        warm = [latency(client, "t1")[0] for _ in range(200)]
+        cold = [latency(client, f"t{i}")[0] for i in range(1, count)]
+    return statistics.median(warm), statistics.median(cold)
+
+
+def fairness(max_concurrency):
+    """Svartider for den lette tenant når alle requests deler WORKERS tråde."""
+    settings.tenant_max_concurrency = max_concurrency
+    get_router().close()
+    stop = threading.Event()
+    rejected = []
+
+    light = []
+    with ThreadPoolExecutor(max_workers=WORKERS) as server:
+
+        def heavy():
+            client = app.test_client()
+            while not stop.is_set():
+                request = server.submit(latency, client, "t0", "/api/activities/rows")
+                if request.result()[1] == 429:
+                    rejected.append(1)
+
+        clients = [threading.Thread(target=heavy) for _ in range(HEAVY_REQUESTS)]
+        for thread in clients:
+            thread.start()
+        time.sleep(0.5)
+        client = app.test_client()
+        for _ in range(20):
+            started = time.perf_counter()
+            server.submit(latency, client, "t1").result()
+            light.append((time.perf_counter() - started) * 1000)
+        stop.set()
+        for thread in clients:
+            thread.join()
+    return statistics.median(light), max(light), len(rejected)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    app.config["TESTING"] = True
+    with tempfile.TemporaryDirectory() as tmp:
+        build(tmp, count)
+        settings.tenants_dir = tmp
+        settings.tenant_proxy_secret = PROXY_SECRET
+        settings.tenant_max_open = 64
+
+        warm_ms, cold_ms = warm_and_cold(count)
+        print(f"{count} tenants, maks {settings.tenant_max_open} åbne")
+        print(f"  varm request           {warm_ms:8.2f} ms (median)")
+        print(f"  kold request + lukning {cold_ms:8.2f} ms (median)")
+        print(f"  åbne tenants bagefter  {len(get_router()):8d}")
+
+        # Uden cache er hver af den tunge tenants requests en fuld forespørgsel
+        settings.fragment_cache_size = 0
+        print(
+            f"\nLet tenant mens tung tenant har {HEAVY_REQUESTS} requests i gang "
+            f"({WORKERS} servertråde):"
+        )
+        for label, limit in [("uden grænse", HEAVY_REQUESTS), ("grænse 4", 4)]:
+            median_ms, worst_ms, rejected = fairness(limit)
+            print(
+                f"  {label:12s} median {median_ms:8.1f} ms  maks {worst_ms:8.1f} ms"
+                f"  ({rejected} afvist med 429)"
+            )
+        get_router().close()
+    settings.reload()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+/*
+ * Support Solutions CRM - klient-side rækker
+ *
+ * Henter en entitetssides rækker fra /api/<entity>/rows (kolonner én gang og
+ * en liste pr. række) og renderer kun de rækker der er synlige i viewporten,
+ * plus lidt buffer. Filtre og søgning kører på alle rækker i hukommelsen.
+ */
+const CRMRows = (function () {
+    const ESCAPES = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'};
+
+    function escape(value) {
+        return value === null || value === undefined
+            ? ''
+            : String(value).replace(/[&<>"']/g, ch => ESCAPES[ch]);
+    }
+
+    // Som Jinja's round-filter: 890000 / 1000 -> "890.0"
+    function round(value, digits) {
+        const factor = Math.pow(10, digits || 0);
+        const text = String(Math.round((Number(value) || 0) * factor) / factor);
+        return text.includes('.') || text.includes('e') ? text : text + '.0';
+    }
+
+    // Som Python's "{:,.0f}".format(value)
+    function thousands(value) {
+        return (Number(value) || 0).toLocaleString('en-US', {maximumFractionDigits: 0});
+    }
+
+    function toRecords(data) {
+        const columns = data.columns;
+        return data.rows.map(values => {
+            const record = {};
+            columns.forEach((name, i) => { record[name] = values[i]; });
+            // Bruges af fritekstsøgningen
+            record._text = values.join(' ').toLowerCase();
+            return record;
+        });
+    }
+
+    /*
+     * options:
+     *   url        - rækkernes API endpoint
+     *   viewport   - element der scroller (fast højde, overflow: auto)
+     *   body       - element rækkerne renderes i (fx <tbody>)
+     *   renderRow  - record -> HTML streng (værdier escapes med CRMRows.escape)
+     *   spacerTag  - HTML for et tomt mellemrum, fx '<tr class="rows-spacer"><td colspan="8"></td></tr>'
+     *   overscan   - ekstra rækker over og under det synlige område
+     */
+    function mount(options) {
+        const {viewport, body, renderRow, spacerTag} = options;
+        const overscan = options.overscan || 10;
+        let records = [];
+        let visible = [];
+        let rowHeight = options.rowHeight || 0;
+        let scheduled = false;
+
+        function spacer(height) {
+            return height > 0 ? spacerTag.replace('rows-spacer"', `rows-spacer" data-height="${height}"`) : '';
+        }
+
+        function render() {
+            scheduled = false;
+            const height = rowHeight || 60;
+            const first = Math.max(0, Math.floor(viewport.scrollTop / height) - overscan);
+            const count = Math.ceil(viewport.clientHeight / height) + 2 * overscan;
+            const last = Math.min(visible.length, first + count);
+
+            body.innerHTML = spacer(first * height)
+                + visible.slice(first, last).map(renderRow).join('')
+                + spacer((visible.length - last) * height);
+
+            // Højder og bredder sættes via data-attributter, ligesom på de
+            // server-renderede sider
+            body.querySelectorAll('[data-height]').forEach(el => {
+                el.style.height = el.dataset.height + 'px';
+            });
+            body.querySelectorAll('[data-width]').forEach(el => {
+                el.style.width = el.dataset.width + '%';
+            });
+
+            if (!rowHeight && last > first) {
+                // Mål en gennemsnitlig rækkehøjde (inkl. margener) én gang og
+                // render igen med den
+                const rendered = body.querySelectorAll(':scope > :not(.rows-spacer)');
+                const firstRow = rendered[0];
+                const lastRow = rendered[rendered.length - 1];
+                const span = lastRow.offsetTop + lastRow.offsetHeight - firstRow.offsetTop;
+                if (span > 0) {
+                    rowHeight = span / rendered.length;
+                    render();
+                }
+            }
+        }
+
+        function schedule() {
+            if (!scheduled) {
+                scheduled = true;
+                requestAnimationFrame(render);
+            }
+        }
+
+        viewport.addEventListener('scroll', schedule);
+        window.addEventListener('resize', schedule);
+
+        const view = {
+            get records() { return records; },
+            get length() { return visible.length; },
+            // Viser kun rækker hvor predicate(record) er sand (null = alle)
+            filter(predicate) {
+                visible = predicate ? records.filter(predicate) : records;
+                viewport.scrollTop = 0;
+                render();
+            },
+            search(term) {
+                term = term.toLowerCase();
+                view.filter(term ? record => record._text.includes(term) : null);
+            },
+        };
+
+        fetch(options.url, {headers: {Accept: 'application/json'}, cache: 'no-cache'})
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) {
+                    throw new Error(data.error || 'Kunne ikke hente rækker');
+                }
+                records = visible = toRecords(data);
+                render();
+            })
+            .catch(error => {
+                body.innerHTML = spacerTag.replace('></', `>${escape(error.message)}</`);
+            });
+
+        return view;
+    }
+
+    return {escape, mount, round, thousands};
+})();
@@ -1,29 +1,68 @@
-import os
+from datetime import datetime, timedelta
 
 from flask import (
     Flask,
+    Response,
     jsonify,
     redirect,
     render_template,
     request,
     session,
+    stream_with_context,
     url_for,
 )
+from flask.json.provider import DefaultJSONProvider
+
+from app import http_cache, tenants
+from app.agent import ask, ask_many, generate_explanation
+from app.config import settings
+from app.db import json_default, run_query
+from app.fragments import cached_fragment
+from app.http_cache import conditional
+from app.live import LiveDashboard
+from app.snapshot import get_snapshot
+
+
+class CRMJSONProvider(DefaultJSONProvider):
+    """Serializes query results in the compact columns/rows wire format"""
+
+    @staticmethod
+    def default(o):
+        try:
+            return json_default(o)
+        except TypeError:
+            return DefaultJSONProvider.default(o)
 
-from app.agent import ask, generate_explanation
-from app.db import run_query
 
 app = Flask(__name__)
+app.json = CRMJSONProvider(app)
 app.secret_key = "support-solutions-crm-secret-key"
+http_cache.init_app(app)
+tenants.init_app(app)
+
+
+def _load_snapshot():
+    """Load the read snapshot at startup so the first requests read from memory"""
+    if not settings.read_snapshot or settings.tenants_dir:
+        return
+    try:
+        get_snapshot(settings.db_path)
+    except Exception as e:
+        print(f"⚠️ Læse-snapshot kunne ikke indlæses: {e}")
+
+
+_load_snapshot()
+
+
+def _ai_key_state():
+    """ETag input for endpoints whose output depends on AI availability"""
+    return (settings.ai_available,)
 
 
 @app.route("/", methods=["GET", "POST"])
 def index():
     # Check if AI is available
-    ai_available = (
-        os.environ.get("OPENAI_API_KEY")
-        and os.environ.get("OPENAI_API_KEY") != "your-openai-api-key-here"
-    )
+    ai_available = settings.ai_available
 
     if request.method == "POST":
         question = request.form.get("question")
@@ -44,7 +83,7 @@ def index():
                     session["error"] = result["error"]
                 else:
                     answer = result.get("rows", [])
-                    session["answer"] = answer
+                    session["answer"] = [dict(row) for row in answer]
                     session.pop("error", None)
 
                     # Generate AI explanation if no results found
@@ -85,323 +124,434 @@ def index():
     )
 
 
-@app.route("/api/crm/stats")
-def crm_stats():
-    """API endpoint to get CRM statistics"""
-    try:
-        # Get key CRM metrics
-        stats = {}
-
-        # Customer stats
-        customer_stats = run_query(
-            "SELECT COUNT(*) as total, "
-            "COUNT(CASE WHEN status = 'Active' THEN 1 END) as active "
-            "FROM customers"
-        )
-        stats["customers"] = (
-            customer_stats[0] if customer_stats else {"total": 0, "active": 0}
-        )
+def _crm_stats():
+    """Key CRM metrics shared by the stats API and the live dashboard"""
+    stats = {}
 
-        # Deal stats
-        deal_stats = run_query(
-            "SELECT COUNT(*) as total, SUM(value) as total_value, "
-            "AVG(probability) as avg_probability FROM deals "
-            "WHERE stage NOT IN ('Closed Won', 'Closed Lost')"
-        )
-        stats["deals"] = (
-            deal_stats[0]
-            if deal_stats
-            else {"total": 0, "total_value": 0, "avg_probability": 0}
-        )
+    # Customer stats
+    customer_stats = run_query(
+        "SELECT COUNT(*) as total, "
+        "COUNT(CASE WHEN status = 'Active' THEN 1 END) as active "
+        "FROM customers"
+    )
+    stats["customers"] = (
+        customer_stats[0] if customer_stats else {"total": 0, "active": 0}
+    )
 
-        # Project stats
-        project_stats = run_query(
-            "SELECT COUNT(*) as total, "
-            "COUNT(CASE WHEN status = 'In Progress' THEN 1 END) as active "
-            "FROM projects"
-        )
-        stats["projects"] = (
-            project_stats[0] if project_stats else {"total": 0, "active": 0}
-        )
+    # Deal stats
+    deal_stats = run_query(
+        "SELECT COUNT(*) as total, SUM(value) as total_value, "
+        "AVG(probability) as avg_probability FROM deals "
+        "WHERE stage NOT IN ('Closed Won', 'Closed Lost')"
+    )
+    stats["deals"] = (
+        deal_stats[0]
+        if deal_stats
+        else {"total": 0, "total_value": 0, "avg_probability": 0}
+    )
 
-        # Consultant stats
-        consultant_stats = run_query(
-            "SELECT COUNT(*) as total, AVG(hourly_rate) as avg_rate "
-            "FROM consultants WHERE status = 'Active'"
-        )
-        stats["consultants"] = (
-            consultant_stats[0] if consultant_stats else {"total": 0, "avg_rate": 0}
-        )
+    # Project stats
+    project_stats = run_query(
+        "SELECT COUNT(*) as total, "
+        "COUNT(CASE WHEN status = 'In Progress' THEN 1 END) as active "
+        "FROM projects"
+    )
+    stats["projects"] = project_stats[0] if project_stats else {"total": 0, "active": 0}
+
+    # Consultant stats
+    consultant_stats = run_query(
+        "SELECT COUNT(*) as total, AVG(hourly_rate) as avg_rate "
+        "FROM consultants WHERE status = 'Active'"
+    )
+    stats["consultants"] = (
+        consultant_stats[0] if consultant_stats else {"total": 0, "avg_rate": 0}
+    )
+
+    return stats
+
+
+def _dashboard_widgets():
+    """Dashboard widget data shared by the dashboard API and the live stream"""
+    # Recent activities
+    recent_activities = run_query("""
+        SELECT a.type, a.subject, a.activity_date, c.company_name
+        FROM activities a
+        LEFT JOIN customers c ON a.customer_id = c.id
+        ORDER BY a.activity_date DESC
+        LIMIT 5
+    """)
+
+    # Top deals by value
+    top_deals = run_query("""
+        SELECT d.title, d.value, d.stage, c.company_name
+        FROM deals d
+        LEFT JOIN customers c ON d.customer_id = c.id
+        WHERE d.stage NOT IN ('Closed Won', 'Closed Lost')
+        ORDER BY d.value DESC
+        LIMIT 5
+    """)
+
+    # Project status distribution
+    project_status = run_query("""
+        SELECT status, COUNT(*) as count
+        FROM projects
+        GROUP BY status
+    """)
+
+    return {
+        "recent_activities": recent_activities,
+        "top_deals": top_deals,
+        "project_status": project_status,
+    }
+
+
+def _live_payload():
+    return {"stats": _crm_stats(), "dashboard": _dashboard_widgets()}
+
+
+# Computes stats once per data change and pushes them to every open dashboard
+live_dashboard = LiveDashboard(_live_payload)
+
+
+def _live_dashboard():
+    """The live dashboard for the current tenant (or the default database)"""
+    tenant = tenants.current_tenant()
+    if tenant is None:
+        return live_dashboard
+    return tenant.resource(
+        "live", lambda: LiveDashboard(_live_payload, path=tenant.path)
+    )
 
-        return jsonify({"success": True, "stats": stats})
+
+@app.route("/api/crm/stats")
+@conditional()
+def crm_stats():
+    """API endpoint to get CRM statistics"""
+    try:
+        return jsonify({"success": True, "stats": _crm_stats()})
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
 @app.route("/api/crm/dashboard")
+@conditional()
 def dashboard_data():
     """API endpoint for dashboard widgets"""
     try:
-        # Recent activities
-        recent_activities = run_query(
-            """
-            SELECT a.type, a.subject, a.activity_date, c.company_name
-            FROM activities a
-            LEFT JOIN customers c ON a.customer_id = c.id
-            ORDER BY a.activity_date DESC
-            LIMIT 5
-        """
-        )
+        return jsonify({"success": True, "data": _dashboard_widgets()})
 
-        # Top deals by value
-        top_deals = run_query(
-            """
-            SELECT d.title, d.value, d.stage, c.company_name
-            FROM deals d
-            LEFT JOIN customers c ON d.customer_id = c.id
-            WHERE d.stage NOT IN ('Closed Won', 'Closed Lost')
-            ORDER BY d.value DESC
-            LIMIT 5
-        """
-        )
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+def _tenant_events(name):
+    """Live events for tenant `name`, kept checked out until the stream closes"""
+    # The request's own tenant scope ends when the view returns, before the
+    # stream starts, so the generator activates the tenant itself
+    with tenants.get_router().activate(name, limited=False):
+        yield from _live_dashboard().events()
 
-        # Project status distribution
-        project_status = run_query(
-            """
-            SELECT status, COUNT(*) as count
-            FROM projects
-            GROUP BY status
-        """
+
+@app.route("/api/crm/stream")
+@tenants.unlimited
+def dashboard_stream():
+    """Server-Sent Events stream with live stats and dashboard data"""
+    tenant = tenants.current_tenant()
+    if tenant is None:
+        events = live_dashboard.events()
+    else:
+        events = _tenant_events(tenant.name)
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/api/ask/batch", methods=["POST"])
+def ask_batch():
+    """API endpoint that answers many questions in one request"""
+    if not settings.ai_available:
+        return (
+            jsonify(
+                {"success": False, "error": "AI-funktionalitet er ikke tilgængelig"}
+            ),
+            503,
         )
 
-        return jsonify(
-            {
-                "success": True,
-                "data": {
-                    "recent_activities": recent_activities,
-                    "top_deals": top_deals,
-                    "project_status": project_status,
-                },
-            }
+    payload = request.get_json(silent=True) or {}
+    questions = payload.get("questions")
+    if (
+        not isinstance(questions, list)
+        or not questions
+        or not all(isinstance(q, str) for q in questions)
+    ):
+        return (
+            jsonify({"success": False, "error": "'questions' skal være en liste"}),
+            400,
+        )
+    max_questions = settings.ask_batch_max_questions
+    if len(questions) > max_questions:
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "error": f"Maks {max_questions} spørgsmål pr. batch",
+                }
+            ),
+            400,
         )
 
+    # Klienter kan sænke, men ikke hæve, den konfigurerede grænse
+    max_concurrency = payload.get("max_concurrency")
+    if not isinstance(max_concurrency, int) or max_concurrency < 1:
+        max_concurrency = None
+    else:
+        max_concurrency = min(max_concurrency, settings.ask_batch_concurrency)
+
+    try:
+        return jsonify({"success": True, **ask_many(questions, max_concurrency)})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
-@app.route("/customers")
-def customers():
-    """Dedicated customers page"""
+CUSTOMERS_SQL = """
+    SELECT c.*,
+           COUNT(d.id) as deal_count,
+           COALESCE(SUM(d.value), 0) as total_deal_value,
+           COUNT(p.id) as project_count
+    FROM customers c
+    LEFT JOIN deals d ON c.id = d.customer_id
+    LEFT JOIN projects p ON c.id = p.customer_id
+    GROUP BY c.id
+    ORDER BY c.company_name
+"""
+
+DEALS_SQL = """
+    SELECT d.*, c.company_name as customer_name,
+           co.name as consultant_name
+    FROM deals d
+    LEFT JOIN customers c ON d.customer_id = c.id
+    LEFT JOIN consultants co ON d.assigned_consultant_id = co.id
+    ORDER BY d.value DESC
+"""
+
+PROJECTS_SQL = """
+    SELECT p.*, c.company_name as customer_name,
+           GROUP_CONCAT(co.name, ', ') as consultant_names,
+           COUNT(pc.consultant_id) as consultant_count
+    FROM projects p
+    LEFT JOIN customers c ON p.customer_id = c.id
+    LEFT JOIN project_consultants pc ON p.id = pc.project_id
+    LEFT JOIN consultants co ON pc.consultant_id = co.id
+    GROUP BY p.id
+    ORDER BY p.start_date DESC
+"""
+
+CONSULTANTS_SQL = """
+    SELECT c.*,
+           COUNT(pc.project_id) as project_count,
+           GROUP_CONCAT(p.name, ', ') as current_projects
+    FROM consultants c
+    LEFT JOIN project_consultants pc ON c.id = pc.consultant_id
+    LEFT JOIN projects p ON pc.project_id = p.id AND p.status = 'In Progress'
+    GROUP BY c.id
+    ORDER BY c.name
+"""
+
+ACTIVITIES_SQL = """
+    SELECT a.*,
+           c.company_name as customer_name,
+           co.name as consultant_name
+    FROM activities a
+    LEFT JOIN customers c ON a.customer_id = c.id
+    LEFT JOIN consultants co ON a.consultant_id = co.id
+    ORDER BY a.activity_date DESC
+"""
+
+
+def _customer_stats(customers_data, today):
+    return {
+        "total": len(customers_data),
+        "active": len([c for c in customers_data if c["status"] == "Active"]),
+        "total_value": sum([c["total_deal_value"] for c in customers_data]),
+        "avg_projects": (
+            sum([c["project_count"] for c in customers_data]) / len(customers_data)
+            if customers_data
+            else 0
+        ),
+    }
+
+
+def _deal_stats(deals_data, today):
+    return {
+        "total": len(deals_data),
+        "total_value": sum([d["value"] for d in deals_data]),
+        "won": len([d for d in deals_data if d["stage"] == "Closed Won"]),
+        "pipeline_value": sum(
+            [
+                d["value"]
+                for d in deals_data
+                if d["stage"] not in ["Closed Won", "Closed Lost"]
+            ]
+        ),
+    }
+
+
+def _project_stats(projects_data, today):
+    return {
+        "total": len(projects_data),
+        "active": len([p for p in projects_data if p["status"] == "In Progress"]),
+        "total_budget": sum([p["budget"] for p in projects_data]),
+        "avg_budget": (
+            sum([p["budget"] for p in projects_data]) / len(projects_data)
+            if projects_data
+            else 0
+        ),
+    }
+
+
+def _consultant_stats(consultants_data, today):
+    return {
+        "total_consultants": len(consultants_data),
+        "active_consultants": len(
+            [c for c in consultants_data if c["status"] == "Active"]
+        ),
+        "avg_rate": (
+            sum([c["hourly_rate"] for c in consultants_data]) / len(consultants_data)
+            if consultants_data
+            else 0
+        ),
+        "total_projects": sum([c["project_count"] for c in consultants_data]),
+    }
+
+
+def _activity_stats(activities_data, today):
+    week_ago = (today - timedelta(days=7)).strftime("%Y-%m-%d")
+    return {
+        "total_activities": len(activities_data),
+        "this_week": len(
+            [
+                a
+                for a in activities_data
+                if a["activity_date"] and a["activity_date"] >= week_ago
+            ]
+        ),
+        "meetings_calls": len(
+            [a for a in activities_data if a["type"] in ["Meeting", "Call"]]
+        ),
+        "follow_ups": len(
+            [a for a in activities_data if a["outcome"] == "Follow-up needed"]
+        ),
+    }
+
+
+# Entity pages: template, SQL for the rows and the stats cards computed from them
+ENTITY_PAGES = {
+    "customers": ("customers.html", CUSTOMERS_SQL, _customer_stats),
+    "deals": ("deals.html", DEALS_SQL, _deal_stats),
+    "projects": ("projects.html", PROJECTS_SQL, _project_stats),
+    "consultants": ("consultants.html", CONSULTANTS_SQL, _consultant_stats),
+    "activities": ("activities.html", ACTIVITIES_SQL, _activity_stats),
+}
+
+
+def _entity_data(entity, today):
+    """Stats and rows JSON for an entity, computed once per data version"""
+
+    def load():
+        _, sql, compute_stats = ENTITY_PAGES[entity]
+        rows = run_query(sql)
+        body = app.json.dumps({"success": True, **rows.to_wire()})
+        return compute_stats(rows, today), body.encode("utf-8")
+
+    return cached_fragment((entity, "data", today.date()), load)
+
+
+def _entity_page(entity):
+    """Render an entity page with all rows, or as a cached shell in client mode"""
+    template, sql, compute_stats = ENTITY_PAGES[entity]
+    today = datetime.now()
+    current_date = today.strftime("%Y-%m-%d")
     try:
-        # Get all customers with stats
-        customers_data = run_query(
-            """
-            SELECT c.*,
-                   COUNT(d.id) as deal_count,
-                   COALESCE(SUM(d.value), 0) as total_deal_value,
-                   COUNT(p.id) as project_count
-            FROM customers c
-            LEFT JOIN deals d ON c.id = d.customer_id
-            LEFT JOIN projects p ON c.id = p.customer_id
-            GROUP BY c.id
-            ORDER BY c.company_name
-        """
+        if settings.render_mode == "client":
+            # The shell only holds stats cards and filters; the browser fetches
+            # the rows from /api/<entity>/rows and renders the visible ones
+            def shell():
+                stats, _ = _entity_data(entity, today)
+                return render_template(
+                    template,
+                    stats=stats,
+                    current_date=current_date,
+                    client_rows=True,
+                    rows_url=url_for("entity_rows", entity=entity),
+                    **{entity: []},
+                )
+
+            return cached_fragment((entity, "page", today.date()), shell)
+
+        rows = run_query(sql)
+        return render_template(
+            template,
+            stats=compute_stats(rows, today),
+            current_date=current_date,
+            **{entity: rows},
         )
 
-        # Customer statistics
-        stats = {
-            "total": len(customers_data),
-            "active": len([c for c in customers_data if c["status"] == "Active"]),
-            "total_value": sum([c["total_deal_value"] for c in customers_data]),
-            "avg_projects": (
-                sum([c["project_count"] for c in customers_data]) / len(customers_data)
-                if customers_data
-                else 0
-            ),
-        }
+    except Exception as e:
+        return render_template(template, stats={}, error=str(e), **{entity: []})
 
-        return render_template("customers.html", customers=customers_data, stats=stats)
 
-    except Exception as e:
-        return render_template("customers.html", customers=[], stats={}, error=str(e))
+@app.route("/customers")
+def customers():
+    """Dedicated customers page"""
+    return _entity_page("customers")
 
 
 @app.route("/deals")
 def deals():
     """Dedicated deals page"""
-    try:
-        # Get all deals with customer and consultant info
-        deals_data = run_query(
-            """
-            SELECT d.*, c.company_name as customer_name,
-                   co.name as consultant_name
-            FROM deals d
-            LEFT JOIN customers c ON d.customer_id = c.id
-            LEFT JOIN consultants co ON d.assigned_consultant_id = co.id
-            ORDER BY d.value DESC
-        """
-        )
-
-        # Deal statistics
-        stats = {
-            "total": len(deals_data),
-            "total_value": sum([d["value"] for d in deals_data]),
-            "won": len([d for d in deals_data if d["stage"] == "Closed Won"]),
-            "pipeline_value": sum(
-                [
-                    d["value"]
-                    for d in deals_data
-                    if d["stage"] not in ["Closed Won", "Closed Lost"]
-                ]
-            ),
-        }
-
-        return render_template("deals.html", deals=deals_data, stats=stats)
-
-    except Exception as e:
-        return render_template("deals.html", deals=[], stats={}, error=str(e))
+    return _entity_page("deals")
 
 
 @app.route("/projects")
 def projects():
     """Dedicated projects page"""
-    try:
-        # Get all projects with customer info and consultant assignments
-        projects_data = run_query(
-            """
-            SELECT p.*, c.company_name as customer_name,
-                   GROUP_CONCAT(co.name, ', ') as consultant_names,
-                   COUNT(pc.consultant_id) as consultant_count
-            FROM projects p
-            LEFT JOIN customers c ON p.customer_id = c.id
-            LEFT JOIN project_consultants pc ON p.id = pc.project_id
-            LEFT JOIN consultants co ON pc.consultant_id = co.id
-            GROUP BY p.id
-            ORDER BY p.start_date DESC
-        """
-        )
-
-        # Project statistics
-        stats = {
-            "total": len(projects_data),
-            "active": len([p for p in projects_data if p["status"] == "In Progress"]),
-            "total_budget": sum([p["budget"] for p in projects_data]),
-            "avg_budget": (
-                sum([p["budget"] for p in projects_data]) / len(projects_data)
-                if projects_data
-                else 0
-            ),
-        }
-
-        return render_template("projects.html", projects=projects_data, stats=stats)
-
-    except Exception as e:
-        return render_template("projects.html", projects=[], stats={}, error=str(e))
+    return _entity_page("projects")
 
 
 @app.route("/consultants")
 def consultants():
     """Dedicated consultants page"""
-    try:
-        # Get all consultants with project assignments
-        consultants_data = run_query(
-            """
-            SELECT c.*,
-                   COUNT(pc.project_id) as project_count,
-                   GROUP_CONCAT(p.name, ', ') as current_projects
-            FROM consultants c
-            LEFT JOIN project_consultants pc ON c.id = pc.consultant_id
-            LEFT JOIN projects p ON pc.project_id = p.id AND p.status = 'In Progress'
-            GROUP BY c.id
-            ORDER BY c.name
-        """
-        )
-
-        # Consultant statistics
-        stats = {
-            "total_consultants": len(consultants_data),
-            "active_consultants": len(
-                [c for c in consultants_data if c["status"] == "Active"]
-            ),
-            "avg_rate": (
-                sum([c["hourly_rate"] for c in consultants_data])
-                / len(consultants_data)
-                if consultants_data
-                else 0
-            ),
-            "total_projects": sum([c["project_count"] for c in consultants_data]),
-        }
-
-        return render_template(
-            "consultants.html", consultants=consultants_data, stats=stats
-        )
-
-    except Exception as e:
-        return render_template(
-            "consultants.html", consultants=[], stats={}, error=str(e)
-        )
+    return _entity_page("consultants")
 
 
 @app.route("/activities")
 def activities():
     """Dedicated activities page"""
-    try:
-        # Get all activities with related customer and consultant info
-        activities_data = run_query(
-            """
-            SELECT a.*,
-                   c.company_name as customer_name,
-                   co.name as consultant_name
-            FROM activities a
-            LEFT JOIN customers c ON a.customer_id = c.id
-            LEFT JOIN consultants co ON a.consultant_id = co.id
-            ORDER BY a.activity_date DESC
-        """
-        )
+    return _entity_page("activities")
 
-        # Activity statistics
-        from datetime import datetime, timedelta
-
-        today = datetime.now()
-        week_ago = today - timedelta(days=7)
-
-        stats = {
-            "total_activities": len(activities_data),
-            "this_week": len(
-                [
-                    a
-                    for a in activities_data
-                    if a["activity_date"]
-                    and a["activity_date"] >= week_ago.strftime("%Y-%m-%d")
-                ]
-            ),
-            "meetings_calls": len(
-                [a for a in activities_data if a["type"] in ["Meeting", "Call"]]
-            ),
-            "follow_ups": len(
-                [a for a in activities_data if a["outcome"] == "Follow-up needed"]
-            ),
-        }
 
-        return render_template(
-            "activities.html",
-            activities=activities_data,
-            stats=stats,
-            current_date=today.strftime("%Y-%m-%d"),
-        )
+@app.route("/api/<entity>/rows")
+@conditional()
+def entity_rows(entity):
+    """Entity page rows in the compact columns/rows wire format"""
+    if entity not in ENTITY_PAGES:
+        return jsonify({"success": False, "error": "Ukendt side"}), 404
+    try:
+        _, body = _entity_data(entity, datetime.now())
+        return Response(body, mimetype="application/json")
 
     except Exception as e:
-        return render_template("activities.html", activities=[], stats={}, error=str(e))
+        return jsonify({"success": False, "error": str(e)}), 500
 
 
 @app.route("/api/status")
+@conditional(vary=_ai_key_state)
 def status():
     """API endpoint to check system status"""
-    ai_available = (
-        os.environ.get("OPENAI_API_KEY")
-        and os.environ.get("OPENAI_API_KEY") != "your-openai-api-key-here"
-    )
+    ai_available = settings.ai_available
 
     # Test database connection with CRM data
     db_available = True
@@ -427,11 +577,7 @@ if __name__ == "__main__":
     print("🚀 Starter Support Solutions CRM System...")
     print("🌐 Åbn din browser på: http://localhost:5001")
 
-    ai_available = (
-        os.environ.get("OPENAI_API_KEY")
-        and os.environ.get("OPENAI_API_KEY") != "your-openai-api-key-here"
-    )
-    if not ai_available:
+    if not settings.ai_available:
         print("⚠️  OpenAI API key ikke fundet - AI funktioner er deaktiveret")
         print("💡 Tilføj din API key til .env filen for fuld CRM funktionalitet")
     else: